@@ -3,17 +3,21 @@ Catalog Enrichment Script
 Adds category and color attributes to ALL products in S3.
 Uses CLIP for classification and ensemble color extraction.
 
-Runtime: ~12-15 hours for 251K products with 4 parallel workers
-Run overnight with: python scripts/enrich_catalog.py --workers=4
+Each product is dominated by 3 S3 round-trips (get meta, get image, put meta),
+so the worker count should be well above the CPU count.
+Run overnight with: python scripts/enrich_catalog.py --workers=32
 """
 
 import boto3
+from botocore.config import Config
+import hashlib
 import json
 import os
 import sys
 import logging
 import argparse
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
 from io import BytesIO
 from PIL import Image
 from tqdm import tqdm
@@ -21,8 +25,23 @@ from tqdm import tqdm
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-from src.clip_classifier import classify_item
-from src.color_extractor import extract_colors_ensemble
+from src.clip_classifier import classify_batch
+from src.color_extractor import extract_colors_batch
+
+# SIMD JPEG decoding (libjpeg-turbo) — 2-4x faster than PIL's libjpeg path.
+# Optional: falls back to PIL when PyTurboJPEG or the native lib is missing.
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB
+    _turbojpeg = TurboJPEG()
+except Exception:
+    _turbojpeg = None
+
+# orjson's C encoder is 5-10x stdlib json on these small dicts — that adds
+# up over 251K meta serializations. Optional, stdlib json is the fallback.
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 logging.basicConfig(
     level=logging.INFO,
@@ -33,21 +52,68 @@ logger = logging.getLogger(__name__)
 # S3 Configuration
 S3_BUCKET = os.getenv("S3_BUCKET", "shoptainment-dev-fashion-dataset-bucket")
 S3_PREFIX = os.getenv("S3_PREFIX", "dataset/products/")
-s3 = boto3.client("s3")
+S3_REGION = os.getenv("S3_REGION", "ap-south-1")
+
+# Pool sized for the worker count; adaptive retries absorb S3 throttling
+s3 = boto3.client(
+    "s3",
+    region_name=S3_REGION,
+    config=Config(
+        max_pool_connections=64,
+        retries={"max_attempts": 3, "mode": "adaptive"},
+        tcp_keepalive=True,
+    ),
+)
+
+# Consolidated meta sidecar (read by the API at startup instead of
+# fetching one meta.json per FAISS candidate)
+SIDECAR_LOCAL_PATH = "faiss/catalog_meta.parquet"
+SIDECAR_S3_KEY = f"{S3_PREFIX}catalog_meta.parquet"
+
 
+# Cached product id listing — paginating 251K prefixes costs ~250 S3 calls
+# per run, so the crawl result is persisted and reused across invocations
+PRODUCT_IDS_KEY = f"{S3_PREFIX}_index/product_ids.txt"
+
+
+def list_all_products(refresh: bool = False):
+    """
+    List all product IDs, preferring the cached listing in S3.
+
+    Pass refresh=True (--refresh-list) to re-crawl the prefix tree and
+    rewrite the cache, e.g. after new products are ingested.
+    """
+    if not refresh:
+        try:
+            obj = s3.get_object(Bucket=S3_BUCKET, Key=PRODUCT_IDS_KEY)
+            product_ids = obj['Body'].read().decode('utf-8').splitlines()
+            if product_ids:
+                logger.info(f"Loaded {len(product_ids)} product ids from cached listing")
+                return product_ids
+        except Exception:
+            logger.info("No cached product listing, crawling S3 prefixes...")
 
-def list_all_products():
-    """List all product IDs from S3"""
     product_ids = []
     paginator = s3.get_paginator("list_objects_v2")
-    
+
     for page in paginator.paginate(Bucket=S3_BUCKET, Prefix=S3_PREFIX, Delimiter='/'):
         for prefix in page.get("CommonPrefixes", []):
             # Extract product ID from prefix
             # e.g., "dataset/products/P000001/" -> "P000001"
             pid = prefix['Prefix'].rstrip('/').split('/')[-1]
             product_ids.append(pid)
-    
+
+    try:
+        s3.put_object(
+            Bucket=S3_BUCKET,
+            Key=PRODUCT_IDS_KEY,
+            Body="\n".join(product_ids).encode('utf-8'),
+            ContentType='text/plain'
+        )
+        logger.info(f"Cached {len(product_ids)} product ids to s3://{S3_BUCKET}/{PRODUCT_IDS_KEY}")
+    except Exception as e:
+        logger.warning(f"Failed to cache product listing: {e}")
+
     return product_ids
 
 
@@ -56,7 +122,10 @@ def load_meta_from_s3(pid: str) -> dict:
     key = f"{S3_PREFIX}{pid}/meta.json"
     try:
         obj = s3.get_object(Bucket=S3_BUCKET, Key=key)
-        return json.loads(obj['Body'].read().decode('utf-8'))
+        data = obj['Body'].read()
+        if orjson is not None:
+            return orjson.loads(data)
+        return json.loads(data.decode('utf-8'))
     except Exception as e:
         logger.warning(f"Failed to load meta for {pid}: {e}")
         return None
@@ -67,7 +136,13 @@ def load_image_from_s3(pid: str, image_name: str = "image_1.jpg") -> Image.Image
     key = f"{S3_PREFIX}{pid}/{image_name}"
     try:
         obj = s3.get_object(Bucket=S3_BUCKET, Key=key)
-        return Image.open(BytesIO(obj['Body'].read())).convert("RGB")
+        data = obj['Body'].read()
+        if _turbojpeg is not None:
+            try:
+                return Image.fromarray(_turbojpeg.decode(data, pixel_format=TJPF_RGB))
+            except Exception:
+                pass  # not a JPEG or decode failed, fall through to PIL
+        return Image.open(BytesIO(data)).convert("RGB")
     except Exception as e:
         logger.warning(f"Failed to load image for {pid}: {e}")
         return None
@@ -77,10 +152,14 @@ def save_meta_to_s3(pid: str, meta: dict):
     """Save updated meta.json to S3"""
     key = f"{S3_PREFIX}{pid}/meta.json"
     try:
+        if orjson is not None:
+            body = orjson.dumps(meta, option=orjson.OPT_INDENT_2)
+        else:
+            body = json.dumps(meta, indent=2, ensure_ascii=False).encode('utf-8')
         s3.put_object(
             Bucket=S3_BUCKET,
             Key=key,
-            Body=json.dumps(meta, indent=2, ensure_ascii=False).encode('utf-8'),
+            Body=body,
             ContentType='application/json'
         )
         return True
@@ -89,42 +168,55 @@ def save_meta_to_s3(pid: str, meta: dict):
         return False
 
 
-def enrich_product(pid: str, force_update: bool = False) -> dict:
+# Number of product images pushed through CLIP per forward pass
+GPU_BATCH_SIZE = int(os.getenv("ENRICH_GPU_BATCH", "16"))
+
+
+def meta_content_hash(meta: dict) -> str:
+    """Hash of the meta content, excluding the stored hash field itself."""
+    payload = {k: v for k, v in meta.items() if k != '_content_hash'}
+    if orjson is not None:
+        data = orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)
+    else:
+        data = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+
+def fetch_product(pid: str, force_update: bool = False) -> dict:
     """
-    Enrich a single product with category and colors.
-    
-    Args:
-        pid: Product ID
-        force_update: If True, re-process even if attributes exist
-    
-    Returns:
-        dict with status and updates made
+    IO half of enrichment: download meta + image and decide what is needed.
+
+    Returns a work item. If 'status' is set the product is terminal (skipped,
+    partial, error) and never reaches the GPU batch; otherwise 'image' is a
+    decoded PIL image awaiting classification/color extraction.
     """
-    result = {
+    item = {
         "product_id": pid,
-        "status": "skipped",
-        "category_added": False,
-        "colors_added": False,
+        "meta": None,
+        "image": None,
+        "needs_category": False,
+        "needs_colors": False,
+        "status": None,
         "error": None
     }
-    
+
     try:
-        # Load existing meta
         meta = load_meta_from_s3(pid)
         if meta is None:
-            result["status"] = "error"
-            result["error"] = "Meta not found"
-            return result
-        
+            item["status"] = "error"
+            item["error"] = "Meta not found"
+            return item
+
+        item["meta"] = meta
+
         # Check if already enriched
         has_category = 'category' in meta and meta['category']
         has_colors = meta.get('attributes', {}).get('colors', [])
-        
+
         if has_category and has_colors and not force_update:
-            result["status"] = "already_enriched"
-            return result
-        
-        # Load image for processing
+            item["status"] = "already_enriched"
+            return item
+
         image = load_image_from_s3(pid)
         if image is None:
             # Fallback: try to extract from title only
@@ -134,60 +226,155 @@ def enrich_product(pid: str, force_update: bool = False) -> dict:
                 colors = extract_from_title(title)
                 if colors:
                     meta.setdefault('attributes', {})['colors'] = colors
-                    result["colors_added"] = True
-            
+
             if not has_category:
                 meta['category'] = 'unknown'
-            
-            save_meta_to_s3(pid, meta)
-            result["status"] = "partial"
-            return result
-        
-        # CLIP classification for category
-        if not has_category or force_update:
-            category, conf, label = classify_item(image)
-            meta['category'] = category
-            meta['category_specific'] = label
-            meta['category_confidence'] = round(conf, 4)
-            result["category_added"] = True
-        
-        # Color extraction
-        if not has_colors or force_update:
-            title = meta.get('title', '')
-            colors = extract_colors_ensemble(image, title)
-            meta.setdefault('attributes', {})['colors'] = colors
-            result["colors_added"] = True
-        
-        # Save updated meta
-        if result["category_added"] or result["colors_added"]:
+
             save_meta_to_s3(pid, meta)
-            result["status"] = "enriched"
-        else:
-            result["status"] = "unchanged"
-        
-        return result
-    
+            item["status"] = "partial"
+            return item
+
+        item["image"] = image
+        item["needs_category"] = not has_category or force_update
+        item["needs_colors"] = not has_colors or force_update
+        return item
+
     except Exception as e:
-        result["status"] = "error"
-        result["error"] = str(e)
-        logger.error(f"Error enriching {pid}: {e}")
-        return result
+        item["status"] = "error"
+        item["error"] = str(e)
+        logger.error(f"Error fetching {pid}: {e}")
+        return item
 
 
-def enrich_catalog(workers: int = 4, batch_size: int = 1000, force_update: bool = False, 
-                   start_from: int = 0, limit: int = None):
+def process_gpu_batch(batch, upload_pool, stats):
+    """
+    GPU half of enrichment: one batched CLIP forward for N products, then
+    per-product color extraction and an async meta upload.
+
+    Errors are isolated per item so one bad image doesn't sink the batch.
+    """
+    classifications = classify_batch([item["image"] for item in batch])
+
+    # One clustering pass covers every crop that needs colors
+    color_items = [item for item in batch if item["needs_colors"]]
+    colors_by_pid = {}
+    if color_items:
+        color_lists = extract_colors_batch(
+            [item["image"] for item in color_items],
+            [item["meta"].get('title', '') for item in color_items])
+        colors_by_pid = {item["product_id"]: colors
+                         for item, colors in zip(color_items, color_lists)}
+
+    for item, (category, conf, label) in zip(batch, classifications):
+        pid = item["product_id"]
+        meta = item["meta"]
+        try:
+            if item["needs_category"]:
+                meta['category'] = category
+                meta['category_specific'] = label
+                meta['category_confidence'] = round(conf, 4)
+
+            if item["needs_colors"]:
+                meta.setdefault('attributes', {})['colors'] = colors_by_pid.get(pid, [])
+
+            if item["needs_category"] or item["needs_colors"]:
+                # Skip the PUT when the new content hashes identically to what
+                # is already stored — a --force pass over an enriched catalog
+                # would otherwise re-upload 251K unchanged objects
+                new_hash = meta_content_hash(meta)
+                if new_hash == meta.get('_content_hash'):
+                    stats["unchanged"] = stats.get("unchanged", 0) + 1
+                else:
+                    meta['_content_hash'] = new_hash
+                    upload_pool.submit(save_meta_to_s3, pid, meta)
+                    stats["enriched"] += 1
+            else:
+                stats["unchanged"] = stats.get("unchanged", 0) + 1
+
+        except Exception as e:
+            stats["errors"] += 1
+            logger.error(f"Error enriching {pid}: {e}")
+
+
+def export_meta_sidecar(product_ids=None, workers: int = 16):
+    """
+    Pack all product metas into a single parquet sidecar.
+
+    The API loads this file once at startup, turning up to 500 S3 GETs per
+    search into in-memory lookups. The full meta.json payload is kept as a
+    JSON column so no fields are lost; the flat columns exist for ad-hoc
+    inspection with pandas/duckdb.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        logger.error("pyarrow not installed, skipping sidecar export")
+        return None
+
+    if product_ids is None:
+        product_ids = list_all_products()
+
+    logger.info(f"Exporting meta sidecar for {len(product_ids)} products...")
+
+    pids, titles, categories, colors, meta_jsons = [], [], [], [], []
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        metas = executor.map(load_meta_from_s3, product_ids)
+        for pid, meta in tqdm(zip(product_ids, metas), total=len(product_ids),
+                              desc="Packing metas"):
+            if not meta:
+                continue
+            category = meta.get('category', '')
+            if isinstance(category, dict):
+                category = category.get('id', '')
+            title = meta.get('title')
+            pids.append(pid)
+            # isinstance guards, not truthiness: a NaN title (stdlib json
+            # parses the literal NaN old metas may carry) is truthy and
+            # would poison the arrow string column
+            titles.append(title if isinstance(title, str) else '')
+            categories.append(category if isinstance(category, str) else '')
+            colors.append([str(c) for c in meta.get('attributes', {}).get('colors', [])
+                           if isinstance(c, str)])
+            meta_jsons.append(json.dumps(meta, ensure_ascii=False))
+
+    table = pa.table({
+        "product_id": pids,
+        "title": titles,
+        "category": categories,
+        "colors": colors,
+        "meta_json": meta_jsons,
+    })
+
+    os.makedirs(os.path.dirname(SIDECAR_LOCAL_PATH), exist_ok=True)
+    pq.write_table(table, SIDECAR_LOCAL_PATH, compression="zstd")
+    logger.info(f"Wrote {table.num_rows} rows to {SIDECAR_LOCAL_PATH}")
+
+    try:
+        s3.upload_file(SIDECAR_LOCAL_PATH, S3_BUCKET, SIDECAR_S3_KEY)
+        logger.info(f"Uploaded sidecar to s3://{S3_BUCKET}/{SIDECAR_S3_KEY}")
+    except Exception as e:
+        logger.error(f"Failed to upload sidecar: {e}")
+
+    return SIDECAR_LOCAL_PATH
+
+
+def enrich_catalog(workers: int = 32, batch_size: int = 1000, force_update: bool = False,
+                   start_from: int = 0, limit: int = None, refresh_list: bool = False):
     """
     Enrich all products in the catalog.
-    
+
     Args:
         workers: Number of parallel workers
         batch_size: Products to process per batch
         force_update: Re-process even if already enriched
         start_from: Start from this product index (for resuming)
         limit: Max products to process (for testing)
+        refresh_list: Re-crawl S3 instead of using the cached id listing
     """
     logger.info("Listing all products from S3...")
-    all_products = list_all_products()
+    all_products = list_all_products(refresh=refresh_list)
     total = len(all_products)
     logger.info(f"Found {total} products")
     
@@ -207,34 +394,58 @@ def enrich_catalog(workers: int = 4, batch_size: int = 1000, force_update: bool
         "partial": 0
     }
     
-    # Process in batches with progress bar
-    with ThreadPoolExecutor(max_workers=workers) as executor:
-        futures = {executor.submit(enrich_product, pid, force_update): pid for pid in products}
-        
+    # Producer-consumer: the IO pool downloads meta + image, the main thread
+    # drains completed fetches into GPU_BATCH_SIZE batches for one CLIP
+    # forward each, and finished metas upload on a separate pool so the GPU
+    # never waits on an S3 PUT
+    with ThreadPoolExecutor(max_workers=workers) as io_pool, \
+         ThreadPoolExecutor(max_workers=8) as upload_pool:
+        # Bounded prefetch: keep at most 2*workers fetches in flight so
+        # completed futures (decoded full-size images) can never pile up
+        # faster than the GPU consumer drains them
+        pid_iter = iter(products)
+        pending = {io_pool.submit(fetch_product, pid, force_update): pid
+                   for pid in islice(pid_iter, 2 * workers)}
+
+        gpu_batch = []
         with tqdm(total=len(products), desc="Enriching catalog") as pbar:
-            for future in as_completed(futures):
-                pid = futures[future]
-                try:
-                    result = future.result()
-                    
-                    if result["status"] == "enriched":
-                        stats["enriched"] += 1
-                    elif result["status"] == "already_enriched":
-                        stats["already_enriched"] += 1
-                    elif result["status"] == "error":
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    pid = pending.pop(future)
+                    try:
+                        item = future.result()
+
+                        if item["status"] == "already_enriched":
+                            stats["already_enriched"] += 1
+                        elif item["status"] == "error":
+                            stats["errors"] += 1
+                        elif item["status"] == "partial":
+                            stats["partial"] += 1
+                        else:
+                            gpu_batch.append(item)
+                            if len(gpu_batch) >= GPU_BATCH_SIZE:
+                                process_gpu_batch(gpu_batch, upload_pool, stats)
+                                gpu_batch = []
+
+                    except Exception as e:
                         stats["errors"] += 1
-                    elif result["status"] == "partial":
-                        stats["partial"] += 1
-                    
-                except Exception as e:
-                    stats["errors"] += 1
-                    logger.error(f"Future error for {pid}: {e}")
-                
-                pbar.update(1)
-                
-                # Log progress every batch_size products
-                if (stats["enriched"] + stats["already_enriched"] + stats["errors"]) % batch_size == 0:
-                    logger.info(f"Progress: {stats}")
+                        logger.error(f"Future error for {pid}: {e}")
+
+                    pbar.update(1)
+
+                    # Log progress every batch_size products
+                    if (stats["enriched"] + stats["already_enriched"] + stats["errors"]) % batch_size == 0:
+                        logger.info(f"Progress: {stats}")
+
+                # Refill the window with one new fetch per drained future
+                for pid in islice(pid_iter, len(done)):
+                    pending[io_pool.submit(fetch_product, pid, force_update)] = pid
+
+            # Flush the trailing partial batch
+            if gpu_batch:
+                process_gpu_batch(gpu_batch, upload_pool, stats)
     
     # Final stats
     logger.info("=" * 50)
@@ -250,23 +461,34 @@ def enrich_catalog(workers: int = 4, batch_size: int = 1000, force_update: bool
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Enrich product catalog with category and colors")
-    parser.add_argument("--workers", type=int, default=4, help="Number of parallel workers")
+    parser.add_argument("--workers", type=int, default=32, help="Number of parallel workers")
     parser.add_argument("--batch-size", type=int, default=1000, help="Batch size for logging")
     parser.add_argument("--force", action="store_true", help="Force re-process already enriched products")
     parser.add_argument("--start-from", type=int, default=0, help="Start from product index (for resuming)")
     parser.add_argument("--limit", type=int, default=None, help="Limit products to process (for testing)")
     parser.add_argument("--test", action="store_true", help="Test mode: process only 10 products")
-    
+    parser.add_argument("--refresh-list", action="store_true",
+                        help="Re-crawl S3 prefixes instead of using the cached id listing")
+    parser.add_argument("--export-sidecar", action="store_true",
+                        help="Write catalog_meta.parquet after enrichment")
+    parser.add_argument("--sidecar-only", action="store_true",
+                        help="Only rebuild the parquet sidecar, skip enrichment")
+
     args = parser.parse_args()
-    
+
     if args.test:
         logger.info("Running in TEST mode (10 products)")
         args.limit = 10
-    
-    enrich_catalog(
-        workers=args.workers,
-        batch_size=args.batch_size,
-        force_update=args.force,
-        start_from=args.start_from,
-        limit=args.limit
-    )
+
+    if not args.sidecar_only:
+        enrich_catalog(
+            workers=args.workers,
+            batch_size=args.batch_size,
+            force_update=args.force,
+            start_from=args.start_from,
+            limit=args.limit,
+            refresh_list=args.refresh_list
+        )
+
+    if args.export_sidecar or args.sidecar_only:
+        export_meta_sidecar()
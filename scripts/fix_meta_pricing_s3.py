@@ -0,0 +1,132 @@
+import json
+import re
+import boto3
+from concurrent.futures import ThreadPoolExecutor
+
+# orjson parses/encodes these small dicts 10x faster than stdlib json;
+# optional, stdlib is the fallback
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BUCKET = "shoptainment-dev-fashion-dataset-bucket"
+PREFIX = "dataset/products/"
+WORKERS = 32
+
+# A fixable price is a >=6-digit bare value ending in 00, or any
+# string-encoded number — fix_price normalizes those to ints (and may
+# also apply the /100 fix). If the raw bytes can't match either form,
+# the file needs no parse at all — the overwhelmingly common case.
+_NEEDS_FIX_RE = re.compile(rb'"(?:sale|original)"\s*:\s*(?:\d{4,}00\b|"\s*[+-]?\d)')
+
+s3 = boto3.client("s3")
+
+
+def fix_price(v):
+    """
+    Fix wrong pricing like 499900 -> 4999
+    Only applied if looks like paise mistake.
+    """
+    if v is None:
+        return None
+
+    # ensure int
+    try:
+        v = int(v)
+    except:
+        return v
+
+    # main fix rule: 499900 => 4999
+    if v >= 100000 and v % 100 == 0:
+        return v // 100
+
+    return v
+
+
+def process_meta(key: str):
+    obj = s3.get_object(Bucket=BUCKET, Key=key)
+    data = obj["Body"].read()
+
+    # Byte-level pre-check: skip the JSON decode/encode for files that
+    # cannot contain a fixable price
+    if not _NEEDS_FIX_RE.search(data):
+        return False
+
+    meta = orjson.loads(data) if orjson is not None else json.loads(data.decode("utf-8"))
+
+    pricing = meta.get("pricing", {})
+    changed = False
+
+    if "sale" in pricing:
+        old = pricing["sale"]
+        new = fix_price(old)
+        if old != new:
+            pricing["sale"] = new
+            changed = True
+
+    if "original" in pricing and pricing["original"] is not None:
+        old = pricing["original"]
+        new = fix_price(old)
+        if old != new:
+            pricing["original"] = new
+            changed = True
+
+    if not changed:
+        return False
+
+    meta["pricing"] = pricing
+
+    if orjson is not None:
+        body = orjson.dumps(meta, option=orjson.OPT_INDENT_2)
+    else:
+        body = json.dumps(meta, ensure_ascii=False, indent=2).encode("utf-8")
+
+    s3.put_object(
+        Bucket=BUCKET,
+        Key=key,
+        Body=body,
+        ContentType="application/json",
+    )
+    return True
+
+
+def _fix(key: str):
+    try:
+        return process_meta(key)
+    except Exception as e:
+        print(f" Failed: {key} -> {e}")
+        return None
+
+
+def main():
+    paginator = s3.get_paginator("list_objects_v2")
+
+    keys = []
+    for page in paginator.paginate(Bucket=BUCKET, Prefix=PREFIX):
+        for obj in page.get("Contents", []):
+            if obj["Key"].endswith("meta.json"):
+                keys.append(obj["Key"])
+
+    updated = 0
+    failed = 0
+
+    # Each file is one GET plus maybe one PUT — pure round-trip latency,
+    # so 32 workers overlap it; get/put_object are thread-safe on a
+    # shared client
+    with ThreadPoolExecutor(max_workers=WORKERS) as ex:
+        for key, changed in zip(keys, ex.map(_fix, keys)):
+            if changed:
+                updated += 1
+                print(f" Updated: {key}")
+            elif changed is None:
+                failed += 1
+
+    print("\nDONE ")
+    print("Total meta files:", len(keys))
+    print("Updated meta files:", updated)
+    print("Failed meta files:", failed)
+
+
+if __name__ == "__main__":
+    main()
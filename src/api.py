@@ -6,20 +6,25 @@ Multi-item detection with exact color matching and tiered ranking.
 from fastapi import FastAPI, UploadFile, Header, HTTPException
 import numpy as np
 import faiss
+import torch
 import json
-import tempfile
 import os
+from io import BytesIO
 import boto3
+from botocore.config import Config
 from dotenv import load_dotenv
 from PIL import Image
 from pathlib import Path
 from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import asyncio
 import logging
 
 # Local imports
-from .embed_dinov2 import embed_image
-from .clip_classifier import classify_item, get_fallback_categories
-from .color_extractor import extract_colors_ensemble
+from .embed_dinov2 import embed_image_pil, embed_images, embed_images_tensor
+from .clip_classifier import classify_batch, get_fallback_categories
+from .color_extractor import extract_colors_batch
 from .filters import apply_all_filters
 
 # YOLO import
@@ -59,11 +64,64 @@ else:
         id_map = json.load(f)
     logger.info(f"Loaded FAISS index with {index.ntotal} vectors")
 
+# Move the index to GPU when a faiss-gpu build and a device are present
+index_on_gpu = False
+if index is not None and hasattr(faiss, "StandardGpuResources"):
+    try:
+        if faiss.get_num_gpus() > 0:
+            _gpu_res = faiss.StandardGpuResources()
+            index = faiss.index_cpu_to_gpu(_gpu_res, 0, index)
+            index_on_gpu = True
+            logger.info("FAISS index moved to GPU")
+    except Exception as e:
+        logger.warning(f"Could not move FAISS index to GPU: {e}")
+
+# Lets index.search accept torch tensors directly (skips the numpy copy)
+try:
+    import faiss.contrib.torch_utils  # noqa: F401
+    FAISS_TORCH_INPUTS = True
+except Exception:
+    FAISS_TORCH_INPUTS = False
+
 # ============ S3 CONFIG ============
 S3_BUCKET = os.getenv("S3_BUCKET", "shoptainment-dev-fashion-dataset-bucket")
 S3_PREFIX = os.getenv("S3_PREFIX", "dataset/products/")
 S3_REGION = os.getenv("S3_REGION", "ap-south-1")
-s3 = boto3.client("s3")
+
+# Persistent client with a pool wide enough for the meta fan-out — the
+# default 10 connections throttles parallel fetches and forces TLS redials
+s3 = boto3.client(
+    "s3",
+    region_name=S3_REGION,
+    config=Config(
+        max_pool_connections=64,
+        retries={"max_attempts": 3, "mode": "adaptive"},
+        tcp_keepalive=True,
+    ),
+)
+
+# ============ META SIDECAR ============
+# Consolidated catalog metadata written by enrich_catalog.py --export-sidecar.
+# One parquet read at startup replaces up to FAISS_K S3 GETs per search.
+META_SIDECAR_PATH = os.getenv("META_SIDECAR_PATH", "faiss/catalog_meta.parquet")
+meta_sidecar = {}
+try:
+    import pyarrow.parquet as pq
+
+    if os.path.exists(META_SIDECAR_PATH):
+        _table = pq.read_table(META_SIDECAR_PATH, columns=["product_id", "meta_json"])
+        meta_sidecar = {
+            pid: json.loads(raw)
+            for pid, raw in zip(_table.column("product_id").to_pylist(),
+                                _table.column("meta_json").to_pylist())
+        }
+        del _table
+        logger.info(f"Loaded meta sidecar with {len(meta_sidecar)} products")
+    else:
+        logger.warning(f"Meta sidecar not found at {META_SIDECAR_PATH}, "
+                       "falling back to per-product S3 fetches")
+except ImportError:
+    logger.warning("pyarrow not installed, meta sidecar disabled")
 
 # ============ YOLO MODEL ============
 YOLO_WEIGHTS = "models/yolov8n.pt"
@@ -82,8 +140,44 @@ else:
 MAX_ITEMS_PER_IMAGE = 5  # Limit items to prevent timeout
 FAISS_K = 500  # Number of candidates to retrieve from FAISS
 MIN_CONFIDENCE = 0.25  # Minimum YOLO detection confidence
+YOLO_IMGSZ = int(os.getenv("YOLO_IMGSZ", "640"))  # 640 is plenty for catalog shots; 1280 was 4x the compute
 CLIP_CONFIDENCE_THRESHOLD = 0.3  # Minimum CLIP classification confidence
 
+# Thread pool for fanning out S3 meta fetches (16-way parallelism is where
+# parallel S3 reads stop scaling, so no point going wider per request)
+META_EXECUTOR = ThreadPoolExecutor(max_workers=16)
+
+# Pool for the three independent per-request stages (CLIP, DINOv2, colors)
+STAGE_EXECUTOR = ThreadPoolExecutor(max_workers=3)
+
+
+# Let cuDNN benchmark conv algorithms — input shapes are fixed per model
+torch.backends.cudnn.benchmark = True
+
+
+@app.on_event("startup")
+async def warmup_models():
+    """
+    Run dummy forwards through every model so cold-start cost (CUDA context,
+    cuDNN algo selection, torch.compile graphs) lands here instead of on the
+    first real /search request.
+    """
+    def _warm():
+        dummy = Image.new("RGB", (640, 640))
+        try:
+            if yolo_model is not None:
+                detect_items_yolo(dummy)
+            for _ in range(3):
+                classify_batch([dummy])
+                emb = embed_images([dummy])
+            if index is not None:
+                search_faiss_batch(emb, k=10)
+            logger.info("Model warmup complete")
+        except Exception as e:
+            logger.warning(f"Model warmup failed: {e}")
+
+    await asyncio.to_thread(_warm)
+
 
 def verify_key(x_api_key: str):
     """Validate API key"""
@@ -91,23 +185,52 @@ def verify_key(x_api_key: str):
         raise HTTPException(status_code=401, detail="Invalid API key")
 
 
-def load_meta_from_s3(pid: str) -> dict:
-    """Load product meta.json from S3"""
+@lru_cache(maxsize=50_000)
+def _fetch_meta_from_s3(pid: str) -> dict:
+    """Cached S3 fetch. Raises on failure so errors are never cached."""
     key = f"{S3_PREFIX}{pid}/meta.json"
+    obj = s3.get_object(Bucket=S3_BUCKET, Key=key)
+    return json.loads(obj["Body"].read().decode("utf-8"))
+
+
+def load_meta_from_s3(pid: str) -> dict:
+    """
+    Load product meta.json from S3.
+
+    Cached process-wide: the catalog is quasi-static and FAISS neighbors for
+    popular queries overlap heavily, so repeat hits skip the S3 round-trip.
+    Only successful loads are cached — a transient S3 error is retried on
+    the next request instead of pinning an empty meta.
+    Callers must treat the returned dict as read-only.
+    Use /cache/invalidate after enrichment rewrites metas.
+    """
     try:
-        obj = s3.get_object(Bucket=S3_BUCKET, Key=key)
-        return json.loads(obj["Body"].read().decode("utf-8"))
+        return _fetch_meta_from_s3(pid)
     except Exception as e:
         logger.warning(f"Failed to load meta for {pid}: {e}")
         return {}
 
 
+# Pre-signed URLs are pure CPU (HMAC under the GIL) and get recomputed for
+# every result — cache them slightly shorter than their 600s expiry
+try:
+    from cachetools import TTLCache
+    _url_cache = TTLCache(maxsize=100_000, ttl=540)
+except ImportError:
+    _url_cache = None
+
+
 def get_product_image_url(pid: str, image_name: str = "image_1.jpg") -> str:
     """
     Generate pre-signed S3 URL for product image.
-    URL expires after 10 minutes (600 seconds).
-    Each search request generates fresh URLs.
+    URL expires after 10 minutes (600 seconds); cached per (pid, image_name)
+    with a TTL that refreshes just before expiry.
     """
+    if _url_cache is not None:
+        cached = _url_cache.get((pid, image_name))
+        if cached is not None:
+            return cached
+
     key = f"{S3_PREFIX}{pid}/{image_name}"
     try:
         url = s3.generate_presigned_url(
@@ -118,6 +241,8 @@ def get_product_image_url(pid: str, image_name: str = "image_1.jpg") -> str:
             },
             ExpiresIn=600  # 10 minutes
         )
+        if _url_cache is not None:
+            _url_cache[(pid, image_name)] = url
         return url
     except Exception as e:
         logger.warning(f"Failed to generate presigned URL for {pid}: {e}")
@@ -125,16 +250,18 @@ def get_product_image_url(pid: str, image_name: str = "image_1.jpg") -> str:
         return f"https://{S3_BUCKET}.s3.{S3_REGION}.amazonaws.com/{key}"
 
 
-def detect_items_yolo(image_path: str, image: Image.Image) -> List[Dict[str, Any]]:
+def detect_items_yolo(image: Image.Image) -> List[Dict[str, Any]]:
     """
     Detect clothing items in image using YOLO.
     Falls back to full image if no detections.
     """
     detections = []
-    
+
     if yolo_model is not None:
         try:
-            results = yolo_model(image_path, imgsz=1280, conf=MIN_CONFIDENCE, verbose=False)
+            # Ultralytics accepts PIL directly — no second decode from disk
+            results = yolo_model(image, imgsz=YOLO_IMGSZ, conf=MIN_CONFIDENCE,
+                                 half=torch.cuda.is_available(), verbose=False)
             
             for r in results:
                 boxes = getattr(r, "boxes", None)
@@ -185,118 +312,224 @@ def detect_items_yolo(image_path: str, image: Image.Image) -> List[Dict[str, Any
     return detections
 
 
-def search_faiss(embedding: np.ndarray, k: int = FAISS_K) -> List[Dict[str, Any]]:
+def lookup_metas(pids: List[str]) -> List[dict]:
+    """Resolve product metas, preferring the in-memory sidecar over S3."""
+    if meta_sidecar:
+        metas = [meta_sidecar.get(pid) for pid in pids]
+        missing = [i for i, m in enumerate(metas) if m is None]
+        if missing:
+            fetched = META_EXECUTOR.map(load_meta_from_s3,
+                                        [pids[i] for i in missing])
+            for i, meta in zip(missing, fetched):
+                metas[i] = meta
+        return metas
+    return list(META_EXECUTOR.map(load_meta_from_s3, pids))
+
+
+def search_faiss_batch(embeddings: np.ndarray, k: int = FAISS_K) -> List[List[Dict[str, Any]]]:
     """
-    Search FAISS index and load product metadata.
-    Returns list of products with scores.
+    Search the FAISS index for a batch of query embeddings in one call.
+
+    FAISS parallelizes across query rows, so N detected items cost one
+    kernel/search invocation instead of N. Candidate metas for all rows are
+    deduplicated and fetched together.
     """
+    if index is None or len(embeddings) == 0:
+        return [[] for _ in range(len(embeddings))]
+
+    if FAISS_TORCH_INPUTS and index_on_gpu and torch.is_tensor(embeddings):
+        # Queries stay on the GPU end-to-end: normalize in torch, search
+        # with the tensor, and only copy the tiny (N, k) result back
+        embs = torch.nn.functional.normalize(embeddings, dim=-1)
+        D, I = index.search(embs, k)
+        D, I = D.cpu().numpy(), I.cpu().numpy()
+    else:
+        if torch.is_tensor(embeddings):
+            embeddings = embeddings.cpu().numpy()
+        # explicit copy: ascontiguousarray returns the input unchanged for
+        # contiguous float32, and normalize_L2 would then mutate the
+        # caller's embeddings in place
+        embs = np.array(embeddings, dtype="float32", copy=True)
+        faiss.normalize_L2(embs)
+        D, I = index.search(embs, k)
+
+    all_hits = []       # per query row: list of (pid, score)
+    unique_pids = []
+    seen = set()
+    for row_i, row_d in zip(I, D):
+        hits = []
+        for idx, score in zip(row_i, row_d):
+            pid = id_map.get(str(int(idx)))
+            if not pid:
+                continue
+            hits.append((pid, float(score)))
+            if pid not in seen:
+                seen.add(pid)
+                unique_pids.append(pid)
+        all_hits.append(hits)
+
+    meta_by_pid = dict(zip(unique_pids, lookup_metas(unique_pids)))
+
+    return [
+        [
+            {
+                "product_id": pid,
+                "similarity_score": score,
+                "meta": meta_by_pid.get(pid) or {}
+            }
+            for pid, score in hits
+        ]
+        for hits in all_hits
+    ]
+
+
+def search_faiss(embedding: np.ndarray, k: int = FAISS_K) -> List[Dict[str, Any]]:
+    """Single-query wrapper around search_faiss_batch."""
     if index is None:
         return []
-    
-    # Normalize embedding
-    emb = embedding.reshape(1, -1).astype("float32")
-    faiss.normalize_L2(emb)
-    
-    # Search
-    D, I = index.search(emb, k)
-    
-    products = []
-    for idx, score in zip(I[0], D[0]):
-        pid = id_map.get(str(int(idx)))
-        if not pid:
-            continue
-        
-        meta = load_meta_from_s3(pid)
-        
-        products.append({
-            "product_id": pid,
-            "similarity_score": float(score),
-            "meta": meta
-        })
-    
-    return products
+    return search_faiss_batch(embedding.reshape(1, -1), k)[0]
 
-@app.post("/search")
-async def search(file: UploadFile, x_api_key: str = Header(None)):
+def run_search_pipeline(image: Image.Image) -> dict:
     """
-    Multi-item visual search endpoint with backward compatibility.
-    
-    Returns both NEW format (detected_items) and OLD format (matches)
-    for frontend compatibility.
+    Synchronous detection → classification → embedding → FAISS pipeline.
+
+    Runs on a worker thread (via asyncio.to_thread) so the GPU forwards and
+    S3 round-trips never block the event loop.
     """
-    verify_key(x_api_key)
-    
-    if index is None:
-        raise HTTPException(status_code=503, detail="FAISS index not loaded")
-    
-    # Save uploaded image
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp:
-        content = await file.read()
-        tmp.write(content)
-        image_path = tmp.name
-    
-    try:
-        # Load image
-        image = Image.open(image_path).convert("RGB")
-        
-        # Step 1: YOLO detection
-        detections = detect_items_yolo(image_path, image)
-        logger.info(f"Detected {len(detections)} items")
-        
-        detected_items = []
-        all_matches = []  # ← For backward compatibility
+    # Step 1: YOLO detection
+    detections = detect_items_yolo(image)
+    logger.info(f"Detected {len(detections)} items")
+
+    detected_items = []
+    all_matches = []  # ← For backward compatibility
+
+    # Step 2: Batch all crops through CLIP and DINOv2 in one forward each.
+    # The three stages are independent until results are combined, so the two
+    # GPU forwards and the CPU color clustering run concurrently — the color
+    # extraction cost hides inside the GPU work.
+    crops = [det["crop"] for det in detections]
+    classify_future = STAGE_EXECUTOR.submit(classify_batch, crops, CLIP_CONFIDENCE_THRESHOLD)
+    # When the index sits on the GPU, keep the embeddings there too
+    embed_fn = embed_images_tensor if (index_on_gpu and FAISS_TORCH_INPUTS) else embed_images
+    embed_future = STAGE_EXECUTOR.submit(embed_fn, crops)
+    colors_future = STAGE_EXECUTOR.submit(extract_colors_batch, crops)
+
+    classifications = classify_future.result()
+    embeddings = embed_future.result()
+    crop_colors = colors_future.result()
+
+    # Step 3: Drop low-confidence items, then issue ONE batched FAISS
+    # search for everything that survives — FAISS parallelizes across
+    # query rows, and one normalize covers the whole matrix
+    kept = []
+    for det, cls, embedding, colors in zip(detections, classifications,
+                                           embeddings, crop_colors):
+        category, clip_conf, _ = cls
+        if category == "unknown" and clip_conf < CLIP_CONFIDENCE_THRESHOLD:
+            logger.warning(f"Skipping item {det['index']} due to low CLIP confidence: {clip_conf:.2f}")
+            continue
+        kept.append((det, cls, embedding, colors))
+
+    if kept:
+        kept_embs = [emb for _, _, emb, _ in kept]
+        query = (torch.stack(kept_embs) if torch.is_tensor(kept_embs[0])
+                 else np.stack(kept_embs))
+    else:
+        query = np.empty((0, 1), dtype="float32")
+    batch_results = search_faiss_batch(query, k=FAISS_K)
+
+    # Step 4: Process each kept item
+    for (det, (category, clip_conf, specific_label), _, detected_colors), faiss_results in zip(
+        kept, batch_results
+    ):
+        # Get fallback categories if needed
+        search_categories = get_fallback_categories(category, clip_conf)
+
+
+        # 4b: Apply post-filters
+        filtered_results = apply_all_filters(
+            faiss_results,
+            category=category,
+            colors=detected_colors,
+            max_results=10
+        )
         
-        # Step 2: Process each detected item
-        for det in detections:
-            crop = det["crop"]
+        # 4c: Format matches
+        matches = []
+        for product in filtered_results:
+            pid = product["product_id"]
+            meta = product["meta"]
             
-            # 2a: CLIP classification
-            category, clip_conf, specific_label = classify_item(crop, CLIP_CONFIDENCE_THRESHOLD)
+            # Get image URL
+            images = meta.get("images", [])
+            if images:
+                img_path = images[0].get("path", "image_1.jpg")
+            else:
+                img_path = "image_1.jpg"
             
-            # Skip if low confidence and not using fallbacks
-            if category == "unknown" and clip_conf < CLIP_CONFIDENCE_THRESHOLD:
-                logger.warning(f"Skipping item {det['index']} due to low CLIP confidence: {clip_conf:.2f}")
-                continue
+            # Get category string (handle both dict and string)
+            category_data = meta.get("category", "")
+            if isinstance(category_data, dict):
+                category_str = category_data.get("id", "")
+                category_label = category_data.get("label", "")
+            else:
+                category_str = category_data
+                category_label = category_data
             
-            # Get fallback categories if needed
-            search_categories = get_fallback_categories(category, clip_conf)
-            
-            # 2b: Extract colors
-            detected_colors = extract_colors_ensemble(crop, "")
-            
-            # 2c: Generate DINOv2 embedding
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp_crop:
-                crop.save(tmp_crop.name, format="JPEG", quality=90)
-                try:
-                    embedding = embed_image(tmp_crop.name)
-                finally:
-                    os.remove(tmp_crop.name)
-            
-            # 2d: Search FAISS (unified index)
-            faiss_results = search_faiss(embedding, k=FAISS_K)
+            match_obj = {
+                "product_id": pid,
+                "meta": {
+                    "product_id": pid,
+                    "title": meta.get("title", ""),
+                    "category": {
+                        "id": category_str,
+                        "label": category_label
+                    },
+                    "pricing": meta.get("pricing", {}),
+                    "attributes": meta.get("attributes", {}),
+                    "images": meta.get("images", []),
+                    "source": meta.get("source", {})
+                },
+                "similarity_score": round(product["similarity_score"], 4)
+            }
             
-            # 2e: Apply post-filters
-            filtered_results = apply_all_filters(
-                faiss_results,
-                category=category,
-                colors=detected_colors,
-                max_results=10
-            )
+            matches.append(match_obj)
+        
+        # Add to detected items (NEW format)
+        detected_items.append({
+            "item_index": det["index"],
+            "bbox": det["bbox"],
+            "yolo_confidence": det["confidence"],
+            "category": category,
+            "specific_label": specific_label,
+            "clip_confidence": round(clip_conf, 4),
+            "detected_colors": detected_colors[:3],
+            "matches": matches
+        })
+        
+        # Add to all_matches for backward compatibility (OLD format)
+        all_matches.extend(matches)
+    
+    # ========== BACKWARD COMPATIBILITY ==========
+    # Handle case: no items detected
+    if not detected_items:
+        # Fallback: Search full image without YOLO detection
+        logger.info("No YOLO detections, falling back to full image search")
+        
+        try:
+            # Use full image
+            embedding = embed_image_pil(image)
+            faiss_results = search_faiss(embedding, k=10)
             
-            # 2f: Format matches
-            matches = []
-            for product in filtered_results:
+            # Format as old-style matches
+            fallback_matches = []
+            for product in faiss_results:
                 pid = product["product_id"]
                 meta = product["meta"]
                 
-                # Get image URL
                 images = meta.get("images", [])
-                if images:
-                    img_path = images[0].get("path", "image_1.jpg")
-                else:
-                    img_path = "image_1.jpg"
+                img_path = images[0].get("path", "image_1.jpg") if images else "image_1.jpg"
                 
-                # Get category string (handle both dict and string)
                 category_data = meta.get("category", "")
                 if isinstance(category_data, dict):
                     category_str = category_data.get("id", "")
@@ -305,7 +538,7 @@ async def search(file: UploadFile, x_api_key: str = Header(None)):
                     category_str = category_data
                     category_label = category_data
                 
-                match_obj = {
+                fallback_matches.append({
                     "product_id": pid,
                     "meta": {
                         "product_id": pid,
@@ -320,106 +553,82 @@ async def search(file: UploadFile, x_api_key: str = Header(None)):
                         "source": meta.get("source", {})
                     },
                     "similarity_score": round(product["similarity_score"], 4)
-                }
-                
-                matches.append(match_obj)
+                })
             
-            # Add to detected items (NEW format)
-            detected_items.append({
-                "item_index": det["index"],
-                "bbox": det["bbox"],
-                "yolo_confidence": det["confidence"],
-                "category": category,
-                "specific_label": specific_label,
-                "clip_confidence": round(clip_conf, 4),
-                "detected_colors": detected_colors[:3],
-                "matches": matches
-            })
-            
-            # Add to all_matches for backward compatibility (OLD format)
-            all_matches.extend(matches)
+            # Return OLD format only (for compatibility)
+            return {
+                "matches": fallback_matches,
+                "detected_items": [],
+                "total_items": 0,
+                "message": "No items detected by YOLO. Showing results for full image."
+            }
         
-        # ========== BACKWARD COMPATIBILITY ==========
-        # Handle case: no items detected
-        if not detected_items:
-            # Fallback: Search full image without YOLO detection
-            logger.info("No YOLO detections, falling back to full image search")
-            
-            try:
-                # Use full image
-                embedding = embed_image(image_path)
-                faiss_results = search_faiss(embedding, k=10)
-                
-                # Format as old-style matches
-                fallback_matches = []
-                for product in faiss_results:
-                    pid = product["product_id"]
-                    meta = product["meta"]
-                    
-                    images = meta.get("images", [])
-                    img_path = images[0].get("path", "image_1.jpg") if images else "image_1.jpg"
-                    
-                    category_data = meta.get("category", "")
-                    if isinstance(category_data, dict):
-                        category_str = category_data.get("id", "")
-                        category_label = category_data.get("label", "")
-                    else:
-                        category_str = category_data
-                        category_label = category_data
-                    
-                    fallback_matches.append({
-                        "product_id": pid,
-                        "meta": {
-                            "product_id": pid,
-                            "title": meta.get("title", ""),
-                            "category": {
-                                "id": category_str,
-                                "label": category_label
-                            },
-                            "pricing": meta.get("pricing", {}),
-                            "attributes": meta.get("attributes", {}),
-                            "images": meta.get("images", []),
-                            "source": meta.get("source", {})
-                        },
-                        "similarity_score": round(product["similarity_score"], 4)
-                    })
-                
-                # Return OLD format only (for compatibility)
-                return {
-                    "matches": fallback_matches,
-                    "detected_items": [],
-                    "total_items": 0,
-                    "message": "No items detected by YOLO. Showing results for full image."
-                }
-            
-            except Exception as e:
-                logger.error(f"Fallback search failed: {e}")
-                return {
-                    "matches": [],
-                    "detected_items": [],
-                    "message": "No clothing items detected. Please upload an image with visible clothing."
-                }
-        
-        # Return BOTH formats for compatibility
-        return {
-            # OLD format (frontend uses this) 
-            "matches": all_matches[:10],
-            
-            # NEW format (for future use)
-            "detected_items": detected_items,
-            "total_items": len(detected_items)
-        }
+        except Exception as e:
+            logger.error(f"Fallback search failed: {e}")
+            return {
+                "matches": [],
+                "detected_items": [],
+                "message": "No clothing items detected. Please upload an image with visible clothing."
+            }
     
+    # Return BOTH formats for compatibility
+    return {
+        # OLD format (frontend uses this) 
+        "matches": all_matches[:10],
+        
+        # NEW format (for future use)
+        "detected_items": detected_items,
+        "total_items": len(detected_items)
+    }
+
+
+@app.post("/search")
+async def search(file: UploadFile, x_api_key: str = Header(None)):
+    """
+    Multi-item visual search endpoint with backward compatibility.
+
+    Returns both NEW format (detected_items) and OLD format (matches)
+    for frontend compatibility.
+    """
+    verify_key(x_api_key)
+
+    if index is None:
+        raise HTTPException(status_code=503, detail="FAISS index not loaded")
+
+    try:
+        # Stream the upload in 64 KB chunks — a single read() of a 10+ MB
+        # phone photo would hog the event loop for the whole copy
+        buf = BytesIO()
+        while chunk := await file.read(1 << 16):
+            buf.write(chunk)
+        buf.seek(0)
+
+        # Decode once, entirely in memory — no temp file, no second read
+        # from disk for YOLO
+        image = Image.open(buf).convert("RGB")
+
+        # Heavy lifting happens off the event loop so concurrent requests
+        # keep being accepted while this one is on the GPU / S3
+        return await asyncio.to_thread(run_search_pipeline, image)
+
     except Exception as e:
         logger.error(f"Search error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-    
-    finally:
-        # Cleanup
-        try:
-            os.remove(image_path)
-        except:
-            pass
+
+
+@app.post("/cache/invalidate")
+async def invalidate_meta_cache(x_api_key: str = Header(None)):
+    """Drop the meta.json cache (call after enrichment rewrites metas)"""
+    verify_key(x_api_key)
+    info = _fetch_meta_from_s3.cache_info()
+    _fetch_meta_from_s3.cache_clear()
+    return {
+        "status": "cleared",
+        "entries_dropped": info.currsize,
+        "hits": info.hits,
+        "misses": info.misses
+    }
+
 
 @app.get("/health")
 async def health():
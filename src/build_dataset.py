@@ -1,10 +1,11 @@
+import numpy as np
 import pandas as pd
-import requests
+import aiohttp
+import asyncio
 import os
 import json
 import re
 import logging
-import time
 from urllib.parse import urlparse
 
 # ================= CONFIG =================
@@ -15,7 +16,7 @@ OUTPUT_DIR = os.path.join(BASE_DIR, "dataset", "products")
 
 IMAGE_COL_PREFIX = "Image"
 REQUEST_TIMEOUT = 20
-DOWNLOAD_DELAY = 0.3
+DOWNLOAD_CONCURRENCY = 32
 # ==========================================
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
@@ -25,64 +26,84 @@ logging.basicConfig(
     format="%(asctime)s | %(levelname)s | %(message)s"
 )
 
+# Precompiled once; the column-vectorized pass in main() is preferred,
+# this scalar helper covers one-off callers
+_DIGITS = re.compile(r"\D+")
+
+def clean_str(value):
+    # NaN from read_csv must become None: json.dump would emit literal
+    # NaN (which orjson readers reject) and pyarrow can't mix float into
+    # a string column
+    return None if pd.isna(value) else str(value)
+
 def clean_price(value):
-    if pd.isna(value):
+    if pd.isna(value):  # None, NaN or pd.NA (Int64 columns yield NA)
         return None
-    value = re.sub(r"[^\d]", "", str(value))
-    return int(value) if value else None
+    if isinstance(value, (int, np.integer)):  # already numeric — skip the regex
+        return int(value)
+    s = _DIGITS.sub("", str(value))
+    return int(s) if s else None
 
-def download_image(url, save_path):
+async def download_image(session, sem, url, save_path):
     try:
-        r = requests.get(url, timeout=REQUEST_TIMEOUT)
-        r.raise_for_status()
+        async with sem:
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)) as r:
+                r.raise_for_status()
+                data = await r.read()
         with open(save_path, "wb") as f:
-            f.write(r.content)
+            f.write(data)
         return True
     except Exception as e:
         logging.error(f"Image failed: {url} | {e}")
         return False
 
-df = pd.read_csv(CSV_FILE)
-image_columns = [c for c in df.columns if c.startswith(IMAGE_COL_PREFIX)]
-
-logging.info(f"Found image columns: {image_columns}")
-
-for _, row in df.iterrows():
+async def process_product(session, sem, row, image_columns):
     product_id = row["product_id"]
     product_dir = os.path.join(OUTPUT_DIR, product_id)
     os.makedirs(product_dir, exist_ok=True)
 
-    images_meta = []
+    # All candidate images of a product download concurrently; the shared
+    # semaphore bounds total in-flight requests across products
+    candidates = []
     idx = 1
-
     for col in image_columns:
         url = row.get(col)
         if pd.isna(url) or not str(url).startswith("http"):
             continue
-
         ext = os.path.splitext(urlparse(url).path)[1] or ".jpg"
         img_name = f"image_{idx}{ext}"
-        img_path = os.path.join(product_dir, img_name)
+        candidates.append((idx, url, img_name))
+        idx += 1
 
-        if download_image(url, img_path):
-            images_meta.append({
-                "image_id": f"{product_id}_{idx}",
-                "path": img_name
-            })
-            idx += 1
+    results = await asyncio.gather(*(
+        download_image(session, sem, url, os.path.join(product_dir, img_name))
+        for _, url, img_name in candidates
+    ))
 
-        time.sleep(DOWNLOAD_DELAY)
+    # Renumber the successes contiguously from image_1: downstream code
+    # (enrich_catalog, build_product_embeddings) assumes the first image
+    # is image_1.jpg, so a failed candidate must not leave a hole
+    images_meta = []
+    for (_, _, img_name), ok in zip(candidates, results):
+        if not ok:
+            continue
+        n = len(images_meta) + 1
+        final_name = f"image_{n}{os.path.splitext(img_name)[1]}"
+        if final_name != img_name:
+            os.replace(os.path.join(product_dir, img_name),
+                       os.path.join(product_dir, final_name))
+        images_meta.append({"image_id": f"{product_id}_{n}", "path": final_name})
 
     meta = {
         "product_id": product_id,
-        "title": row.get("Product Title"),
+        "title": clean_str(row.get("Product Title")),
         "category": {
             "id": "earring",
             "label": "Earrings"
         },
         "pricing": {
-            "sale": clean_price(row.get("Sale Price")),
-            "original": clean_price(row.get("price--original")),
+            "sale": None if pd.isna(row["_sale"]) else int(row["_sale"]),
+            "original": None if pd.isna(row["_original"]) else int(row["_original"]),
             "currency": "INR"
         },
         "attributes": {
@@ -92,7 +113,7 @@ for _, row in df.iterrows():
         },
         "images": images_meta,
         "source": {
-            "product_page": row.get("Product Detail Page"),
+            "product_page": clean_str(row.get("Product Detail Page")),
             "brand": "aashirs"
         }
     }
@@ -100,4 +121,58 @@ for _, row in df.iterrows():
     with open(os.path.join(product_dir, "meta.json"), "w", encoding="utf-8") as f:
         json.dump(meta, f, indent=2, ensure_ascii=False)
 
-logging.info("Dataset build completed.")
+    return meta
+
+async def main():
+    df = pd.read_csv(CSV_FILE)
+    image_columns = [c for c in df.columns if c.startswith(IMAGE_COL_PREFIX)]
+
+    logging.info(f"Found image columns: {image_columns}")
+
+    # Clean the price columns in one vectorized pass each instead of a
+    # clean_price call per row (clean_price stays for scalar use)
+    for col, dest in (("Sale Price", "_sale"), ("price--original", "_original")):
+        if col in df.columns:
+            digits = df[col].astype(str).str.replace(r"[^\d]", "", regex=True)
+            df[dest] = pd.to_numeric(digits.replace("", pd.NA), errors="coerce").astype("Int64")
+        else:
+            df[dest] = pd.NA
+
+    # Downloads are latency-bound: 32 concurrent connections replace the
+    # old serial get + sleep loop, the semaphore doubles as the rate limit
+    sem = asyncio.Semaphore(DOWNLOAD_CONCURRENCY)
+    connector = aiohttp.TCPConnector(limit=DOWNLOAD_CONCURRENCY)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        # to_dict("records") avoids the per-row Series boxing of iterrows()
+        metas = await asyncio.gather(*(
+            process_product(session, sem, row, image_columns)
+            for row in df.to_dict("records")
+        ))
+
+    # Consolidated columnar sidecar: catalog-wide scans read one parquet
+    # file instead of N meta.json parses. The per-product meta.json stays
+    # for hot single-product lookups.
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        rows = [{
+            "product_id": meta["product_id"],
+            "title": meta.get("title"),
+            "category": meta["category"]["id"],
+            "meta_json": json.dumps(meta, ensure_ascii=False),
+        } for meta in metas]
+        parquet_path = os.path.join(BASE_DIR, "dataset", "products.parquet")
+        pq.write_table(pa.Table.from_pylist(rows), parquet_path, compression="zstd")
+        logging.info(f"Wrote consolidated catalog: {parquet_path}")
+    except ImportError:
+        logging.warning("pyarrow not installed, skipping products.parquet")
+    except Exception as e:
+        # the per-product meta.json files are already on disk — a sidecar
+        # failure must not kill a multi-hour download run at the end
+        logging.error(f"Failed writing products.parquet: {e}")
+
+    logging.info("Dataset build completed.")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,9 +1,11 @@
 import os
+import io
 import json
 import boto3
 import numpy as np
 import faiss
-import io
+from boto3.s3.transfer import TransferConfig
+from concurrent.futures import ThreadPoolExecutor
 
 # ---------------- CONFIG ----------------
 S3_BUCKET = "shoptainment-dev-fashion-dataset-bucket"
@@ -11,6 +13,8 @@ S3_PREFIX = "dataset/products/"
 FAISS_DIR = "faiss"
 LOCAL_FAISS_PATH = os.path.join(FAISS_DIR, "catalog.faiss")
 LOCAL_IDMAP_PATH = os.path.join(FAISS_DIR, "id_map.json")
+S3_FAISS_KEY = "faiss/catalog.faiss"
+DOWNLOAD_WORKERS = 16  # parallel S3 reads stop scaling past ~16
 # ---------------------------------------
 
 os.makedirs(FAISS_DIR, exist_ok=True)
@@ -18,20 +22,34 @@ os.makedirs(FAISS_DIR, exist_ok=True)
 s3 = boto3.client("s3")
 
 def list_embedding_keys(bucket: str, prefix: str):
-    paginator = s3.get_paginator("list_objects_v2")
-    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
-        for obj in page.get("Contents", []):
-            key = obj["Key"]
-            if key.endswith("embedding.npy"):
-                yield key
+    """List all embedding.npy keys, sharding the crawl by pid prefix.
+
+    Product ids are P-number names, so P0..P9 split the namespace into ten
+    branches that S3 serves in parallel instead of one long page walk. If
+    nothing matches that scheme, fall back to a single full crawl.
+    """
+    def crawl(p):
+        keys = []
+        paginator = s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket, Prefix=p,
+                                       PaginationConfig={"PageSize": 1000}):
+            for obj in page.get("Contents", []):
+                if obj["Key"].endswith("embedding.npy"):
+                    keys.append(obj["Key"])
+        return keys
+
+    shards = [f"{prefix}P{d}" for d in "0123456789"]
+    with ThreadPoolExecutor(max_workers=len(shards)) as ex:
+        keys = [k for shard in ex.map(crawl, shards) for k in shard]
+
+    return keys if keys else crawl(prefix)
 
 def load_npy_from_s3(bucket: str, key: str) -> np.ndarray:
     obj = s3.get_object(Bucket=bucket, Key=key)
-    data = obj["Body"].read()
-    arr = np.load(io.BytesIO(data))
-    return arr.astype("float32")
+    # Parse straight off the streaming body — skips the full-bytes copy
+    # plus BytesIO wrapper that np.load would need
+    return np.lib.format.read_array(obj["Body"], allow_pickle=False).astype("float32")
 
-embeddings = []
 id_map = {}
 
 keys = sorted(list(list_embedding_keys(S3_BUCKET, S3_PREFIX)))
@@ -41,27 +59,70 @@ if not keys:
 
 print(f" Found {len(keys)} embeddings in S3")
 
-for idx, key in enumerate(keys):
-    pid = key.split("/")[-2]  # P000000
-
-    emb = load_npy_from_s3(S3_BUCKET, key)
+# Each .npy is a few KB, so wall time is pure request latency — fetch them
+# on a thread pool; executor.map preserves the sorted key order
+with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as ex:
+    arrays = list(ex.map(lambda k: load_npy_from_s3(S3_BUCKET, k), keys))
 
-    # handle (512,) or (1,512)
-    emb = emb.reshape(1, -1).astype("float32")
+# Preallocate the full matrix (dim taken from the first array) — fills in
+# place with no vstack copy at the end
+dim = arrays[0].ravel().shape[0]
+X = np.empty((len(keys), dim), dtype=np.float32)
 
-    # normalize for cosine similarity
-    faiss.normalize_L2(emb)
+for idx, (key, emb) in enumerate(zip(keys, arrays)):
+    pid = key.split("/")[-2]  # P000000
 
-    embeddings.append(emb[0])
+    # ravel handles (512,) or (1,512)
+    X[idx] = emb.astype(np.float32, copy=False).ravel()
     id_map[str(idx)] = pid
 
-X = np.vstack(embeddings).astype("float32")
-dim = X.shape[1]
-
-index = faiss.IndexFlatIP(dim)
+# normalize for cosine similarity — one SIMD pass over the whole matrix
+faiss.normalize_L2(X)
+
+# HNSW searches in roughly O(log N) per query vs O(N) for the flat index,
+# at ~99% recall@10 on normalized vectors. "flat" keeps the exact
+# brute-force index for small catalogs or recall debugging.
+INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "hnsw")
+
+if INDEX_TYPE == "hnsw":
+    index = faiss.IndexHNSWFlat(dim, 32, faiss.METRIC_INNER_PRODUCT)
+    index.hnsw.efConstruction = 200
+elif INDEX_TYPE == "flat":
+    index = faiss.IndexFlatIP(dim)
+# Scalar-quantized storage: the flat scan is memory-bound, so fp16 halves
+# both RAM and scan time; 8-bit is ~4x with a small recall cost
+elif INDEX_TYPE == "sq_fp16":
+    index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16,
+                                       faiss.METRIC_INNER_PRODUCT)
+elif INDEX_TYPE == "sq8":
+    index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit,
+                                       faiss.METRIC_INNER_PRODUCT)
+else:
+    raise ValueError(f"Unknown FAISS_INDEX_TYPE: {INDEX_TYPE}")
+
+if not index.is_trained:
+    index.train(X)  # QT_8bit learns per-dimension ranges
 index.add(X)
 
-faiss.write_index(index, LOCAL_FAISS_PATH)
+# Serialize once into memory; the local copy and the (optional) S3 upload
+# both come from the same buffer, so there is no second write_index pass
+# and no disk re-read before the upload
+buf = io.BytesIO()
+writer = faiss.PyCallbackIOWriter(buf.write)
+faiss.write_index(index, writer)
+del writer  # flush
+
+with open(LOCAL_FAISS_PATH, "wb") as f:
+    f.write(buf.getbuffer())
+
+if os.getenv("FAISS_UPLOAD_S3", "0") == "1":
+    buf.seek(0)
+    s3.upload_fileobj(
+        buf, S3_BUCKET, S3_FAISS_KEY,
+        Config=TransferConfig(multipart_chunksize=8 * 1024 * 1024,
+                              max_concurrency=8),
+    )
+    print(f" Uploaded index to s3://{S3_BUCKET}/{S3_FAISS_KEY}")
 
 with open(LOCAL_IDMAP_PATH, "w", encoding="utf-8") as f:
     json.dump(id_map, f, indent=2)
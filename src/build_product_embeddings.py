@@ -1,93 +1,170 @@
-import json
+import io
+import os
 import boto3
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+from tqdm import tqdm
 
-BUCKET = "shoptainment-dev-fashion-dataset-bucket"
-PREFIX = "dataset/products/"
+from PIL import Image
 
-s3 = boto3.client("s3")
-
-
-def fix_price(v):
-    """
-    Fix wrong pricing like 499900 -> 4999
-    Only applied if looks like paise mistake.
-    """
-    if v is None:
-        return None
-
-    # ensure int
-    try:
-        v = int(v)
-    except:
-        return v
-
-    # main fix rule: 499900 => 4999
-    if v >= 100000 and v % 100 == 0:
-        return v // 100
-
-    return v
+from yolo_detector import detect_and_crop
+from embed_dinov2 import embed_image_paths, embed_images, aggregate_embeddings
 
+# ---------------- CONFIG ----------------
+S3_BUCKET = "shoptainment-dev-fashion-dataset-bucket"
+S3_PREFIX = "dataset/products/"
+TMP_DIR = "tmp_download"
+CROP_DIR = os.path.join(TMP_DIR, "crops")
+IMAGE_NAMES = ["image_1.jpg", "image_2.jpg"]
+DOWNLOAD_WORKERS = 16  # parallel S3 reads stop scaling past ~16
+# ----------------------------------------
 
-def process_meta(key: str):
-    obj = s3.get_object(Bucket=BUCKET, Key=key)
-    data = obj["Body"].read().decode("utf-8")
-    meta = json.loads(data)
+os.makedirs(TMP_DIR, exist_ok=True)
 
-    pricing = meta.get("pricing", {})
-    changed = False
-
-    if "sale" in pricing:
-        old = pricing["sale"]
-        new = fix_price(old)
-        if old != new:
-            pricing["sale"] = new
-            changed = True
+s3 = boto3.client("s3")
 
-    if "original" in pricing and pricing["original"] is not None:
-        old = pricing["original"]
-        new = fix_price(old)
-        if old != new:
-            pricing["original"] = new
-            changed = True
 
-    if not changed:
-        return False
+def list_product_keys():
+    """One bucket-wide listing mapping product id -> set of file basenames.
 
-    meta["pricing"] = pricing
+    Existence checks (embedding.npy done? which images are present?) then
+    become set lookups instead of a head_object round-trip per key.
 
-    s3.put_object(
-        Bucket=BUCKET,
-        Key=key,
-        Body=json.dumps(meta, ensure_ascii=False, indent=2).encode("utf-8"),
-        ContentType="application/json",
-    )
-    return True
+    The crawl is sharded across the P0..P9 pid prefixes so S3 serves ten
+    branches in parallel rather than one sequential page walk; a full
+    crawl remains as fallback for non-P names.
+    """
+    def crawl(prefix):
+        out = {}
+        paginator = s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=S3_BUCKET, Prefix=prefix,
+                                       PaginationConfig={"PageSize": 1000}):
+            for obj in page.get("Contents", []):
+                # "dataset/products/P000001/image_1.jpg" -> ("P000001", "image_1.jpg")
+                parts = obj["Key"][len(S3_PREFIX):].split("/")
+                if len(parts) == 2 and parts[0]:
+                    out.setdefault(parts[0], set()).add(parts[1])
+        return out
+
+    shards = [f"{S3_PREFIX}P{d}" for d in "0123456789"]
+    keys_by_pid = {}
+    with ThreadPoolExecutor(max_workers=len(shards)) as ex:
+        for shard in ex.map(crawl, shards):
+            keys_by_pid.update(shard)
+
+    return keys_by_pid if keys_by_pid else crawl(S3_PREFIX)
+
+
+def download_image_from_s3(key: str) -> Image.Image:
+    # Fetch and decode entirely in memory — no tmp-file write/read pair
+    buf = io.BytesIO()
+    s3.download_fileobj(S3_BUCKET, key, buf)
+    buf.seek(0)
+    return Image.open(buf).convert("RGB")
+
+
+def upload_npy_to_s3(key: str, array: np.ndarray):
+    # Serialize into memory and upload directly — no write-then-read
+    # round trip through the tmp dir
+    buf = io.BytesIO()
+    np.save(buf, array.astype(np.float32, copy=False))
+    buf.seek(0)
+    s3.upload_fileobj(buf, S3_BUCKET, key)
+
+
+def fetch_product(pid: str, basenames: set) -> dict:
+    """IO half: download the product's images (runs on the thread pool)."""
+    if "embedding.npy" in basenames:
+        return {"pid": pid, "status": "skipped", "images": []}
+
+    images = []
+    for image_name in IMAGE_NAMES:
+        if image_name not in basenames:
+            continue
+        img_key = f"{S3_PREFIX}{pid}/{image_name}"
+        images.append((image_name, download_image_from_s3(img_key)))
+
+    if not images:
+        return {"pid": pid, "status": "no_images", "images": []}
+
+    return {"pid": pid, "status": None, "images": images}
+
+
+def embed_product(pid: str, images: list) -> np.ndarray:
+    """GPU half: detect, crop and embed (runs on the main thread)."""
+    crop_paths = []
+    for image_name, img in images:
+        base = f"{pid}_{os.path.splitext(image_name)[0]}"
+        crop_paths.extend(detect_and_crop(img, CROP_DIR, name=base))
+
+    if crop_paths:
+        # Batched forward with decode overlapped against the GPU — one
+        # kernel launch for all crops of the product
+        embs = embed_image_paths(crop_paths)
+    else:
+        # YOLO found nothing: embed the full (already decoded) images
+        embs = embed_images([img for _, img in images])
+
+    agg = aggregate_embeddings(embs)
+
+    for path in set(crop_paths):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    return agg
 
 
 def main():
-    paginator = s3.get_paginator("list_objects_v2")
-
-    total = 0
-    updated = 0
-
-    for page in paginator.paginate(Bucket=BUCKET, Prefix=PREFIX):
-        for obj in page.get("Contents", []):
-            key = obj["Key"]
-            if not key.endswith("meta.json"):
-                continue
-
-            total += 1
-
-            try:
-                if process_meta(key):
-                    updated += 1
-                    print(f" Updated: {key}")
-            except Exception as e:
-                print(f" Failed: {key} -> {e}")
+    keys_by_pid = list_product_keys()
+    print(f" Found {len(keys_by_pid)} products in S3")
+
+    stats = {"done": 0, "skipped": 0, "no_images": 0, "failed": 0}
+
+    # Producer-consumer: the pool downloads images ahead of the GPU, the
+    # main thread does YOLO + embedding as fetches complete, and uploads
+    # go back to the pool so the GPU never waits on an S3 PUT
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as io_pool:
+        # Bounded prefetch: at most 2x the worker count of fetches in
+        # flight, so decoded images waiting for the GPU stay capped
+        # instead of buffering the whole catalog in completed futures
+        pid_iter = iter(sorted(keys_by_pid))
+        pending = {io_pool.submit(fetch_product, pid, keys_by_pid[pid]): pid
+                   for pid in islice(pid_iter, 2 * DOWNLOAD_WORKERS)}
+
+        with tqdm(total=len(keys_by_pid), desc="Embedding products") as pbar:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    pid = pending.pop(future)
+                    try:
+                        item = future.result()
+                        if item["status"]:
+                            stats[item["status"]] += 1
+                            continue
+
+                        agg = embed_product(pid, item["images"])
+                        io_pool.submit(upload_npy_to_s3,
+                                       f"{S3_PREFIX}{pid}/embedding.npy", agg)
+                        stats["done"] += 1
+                    except Exception as e:
+                        stats["failed"] += 1
+                        print(f" Failed: {pid} -> {e}")
+                    finally:
+                        pbar.update(1)
+
+                # Refill the window with one new fetch per drained future
+                for pid in islice(pid_iter, len(done)):
+                    pending[io_pool.submit(fetch_product, pid, keys_by_pid[pid])] = pid
 
     print("\nDONE ")
-    print("Total meta files:", total)
-    print("Updated meta files:", updated)
+    print("Embedded:", stats["done"])
+    print("Skipped (already embedded):", stats["skipped"])
+    print("No images:", stats["no_images"])
+    print("Failed:", stats["failed"])
 
 
 if __name__ == "__main__":
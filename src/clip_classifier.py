@@ -4,7 +4,9 @@ Uses OpenAI's CLIP model to classify cropped fashion items into categories
 without any training. This is the same approach Google Lens uses.
 """
 
+import os
 import torch
+import torch.nn.functional as F
 from PIL import Image
 from transformers import CLIPProcessor, CLIPModel
 from typing import Tuple, List
@@ -21,6 +23,21 @@ logger.info(f"Loading CLIP model: {MODEL_NAME} on {device}")
 model = CLIPModel.from_pretrained(MODEL_NAME).to(device)
 processor = CLIPProcessor.from_pretrained(MODEL_NAME)
 model.eval()
+
+# fp16 + compiled graph on GPU: the ViT forward is compute-bound
+USE_FP16 = device == "cuda"
+if USE_FP16:
+    model = model.half()
+# CPU-only deployments: dynamic INT8 quantization of the Linear layers
+# (opt-in — slightly lower confidence scores, much faster on VNNI CPUs)
+elif os.getenv("CPU_INT8", "0") == "1":
+    model = torch.ao.quantization.quantize_dynamic(
+        model, {torch.nn.Linear}, dtype=torch.qint8)
+try:
+    model = torch.compile(model, mode="reduce-overhead")
+except Exception:
+    pass  # torch.compile unavailable on this torch build
+
 logger.info("CLIP model loaded successfully")
 
 # Fashion category labels (hierarchical for better accuracy)
@@ -55,6 +72,15 @@ for category, labels in CATEGORY_LABELS.items():
         ALL_LABELS.append(label)
         LABEL_TO_CATEGORY[label] = category
 
+# The label prompts never change, so the text tower runs exactly once at
+# module load; inference is then just the image tower plus one matmul
+# against these cached (normalized) features — roughly half the FLOPs.
+with torch.inference_mode():
+    _text_inputs = processor(text=ALL_LABELS, return_tensors="pt", padding=True)
+    _text_inputs = {k: v.to(device) for k, v in _text_inputs.items()}
+    TEXT_FEATS = F.normalize(model.get_text_features(**_text_inputs), dim=-1)
+LOGIT_SCALE = model.logit_scale.exp().item()
+
 
 def classify_item(image: Image.Image, confidence_threshold: float = 0.3) -> Tuple[str, float, str]:
     """
@@ -71,23 +97,16 @@ def classify_item(image: Image.Image, confidence_threshold: float = 0.3) -> Tupl
     If confidence < threshold, returns ("unknown", confidence, "unknown")
     """
     try:
-        # Prepare inputs for CLIP
-        inputs = processor(
-            text=ALL_LABELS, 
-            images=image, 
-            return_tensors="pt", 
-            padding=True
-        )
-        
-        # Move to device
-        inputs = {k: v.to(device) for k, v in inputs.items()}
-        
-        # Get predictions
-        with torch.no_grad():
-            outputs = model(**inputs)
-            logits_per_image = outputs.logits_per_image
-            probs = logits_per_image.softmax(dim=1)
-        
+        # Only the image needs preprocessing — text features are cached
+        pixel_values = processor(images=image, return_tensors="pt").pixel_values.to(device)
+        if USE_FP16:
+            pixel_values = pixel_values.half()
+
+        # Image tower + matmul against the cached text features
+        with torch.inference_mode():
+            img_feats = F.normalize(model.get_image_features(pixel_values=pixel_values), dim=-1)
+            probs = (LOGIT_SCALE * img_feats @ TEXT_FEATS.T).float().softmax(dim=1)
+
         # Get top prediction
         confidence = probs.max().item()
         predicted_idx = probs.argmax().item()
@@ -119,21 +138,15 @@ def classify_batch(images: List[Image.Image], confidence_threshold: float = 0.3)
         List of (category, confidence, specific_label) tuples
     """
     try:
-        # Process batch
-        inputs = processor(
-            text=ALL_LABELS,
-            images=images,
-            return_tensors="pt",
-            padding=True
-        )
-        
-        inputs = {k: v.to(device) for k, v in inputs.items()}
-        
-        with torch.no_grad():
-            outputs = model(**inputs)
-            logits_per_image = outputs.logits_per_image
-            probs = logits_per_image.softmax(dim=1)
-        
+        # Process batch (text features are cached, images only)
+        pixel_values = processor(images=images, return_tensors="pt").pixel_values.to(device)
+        if USE_FP16:
+            pixel_values = pixel_values.half()
+
+        with torch.inference_mode():
+            img_feats = F.normalize(model.get_image_features(pixel_values=pixel_values), dim=-1)
+            probs = (LOGIT_SCALE * img_feats @ TEXT_FEATS.T).float().softmax(dim=1)
+
         results = []
         for i in range(len(images)):
             confidence = probs[i].max().item()
@@ -6,7 +6,7 @@ Matches Google Lens approach with tiered color similarity.
 
 import numpy as np
 from PIL import Image
-from sklearn.cluster import KMeans
+from sklearn.cluster import MiniBatchKMeans
 from collections import Counter
 from typing import List, Tuple, Optional
 import logging
@@ -15,6 +15,14 @@ import re
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Numba JIT path for dominant-color voting (optional). A packed 15-bit
+# histogram over the masked pixels replaces the KMeans fit entirely and
+# runs in microseconds per crop once compiled.
+try:
+    import numba
+except ImportError:
+    numba = None
+
 # Comprehensive color keywords mapping
 COLOR_KEYWORDS = {
     # Reds
@@ -49,6 +57,31 @@ COLOR_KEYWORDS = {
     'silver': ['silver', 'chrome', 'metallic'],
 }
 
+# One compiled alternation scans the title in a single pass instead of ~80
+# per-keyword regex searches. The zero-width lookahead matches without
+# consuming, so overlapping keywords all register ("navy blue" yields
+# both navy and blue, as the old independent searches did); longest-first
+# ordering keeps multi-word keywords ahead of their substrings. A keyword
+# can map to several colors (e.g. "gold" -> yellow and gold).
+KW_TO_COLORS = {}
+for _color, _kws in COLOR_KEYWORDS.items():
+    for _kw in _kws:
+        KW_TO_COLORS.setdefault(_kw.lower(), []).append(_color)
+
+# A multi-word keyword still shadows keywords embedded at its own start
+# ("charcoal black" hides "charcoal"), so fold every embedded keyword's
+# colors into the longer keyword's mapping
+for _kw, _colors in KW_TO_COLORS.items():
+    for _other, _other_colors in KW_TO_COLORS.items():
+        if _other != _kw and re.search(r'\b' + re.escape(_other) + r'\b', _kw):
+            for _c in _other_colors:
+                if _c not in _colors:
+                    _colors.append(_c)
+
+TITLE_RE = re.compile(
+    r'(?=\b(' + '|'.join(sorted(map(re.escape, KW_TO_COLORS), key=len, reverse=True)) + r')\b)'
+)
+
 # RGB reference colors for K-means mapping
 RGB_REFERENCE = {
     'red': (220, 20, 60),
@@ -71,6 +104,18 @@ RGB_REFERENCE = {
     'beige': (245, 245, 220),
 }
 
+# Reference palette as an array so nearest-color lookups are one numpy
+# broadcast instead of a Python loop over RGB_REFERENCE per query
+REF_NAMES = list(RGB_REFERENCE)
+REF_ARR = np.asarray(list(RGB_REFERENCE.values()), dtype=np.float32)
+
+
+def nearest_color_names(rgbs) -> List[str]:
+    """Map an (N, 3) array of RGB values to their nearest reference names."""
+    rgbs = np.asarray(rgbs, dtype=np.float32).reshape(-1, 3)
+    d2 = ((rgbs[:, None, :] - REF_ARR[None, :, :]) ** 2).sum(-1)
+    return [REF_NAMES[i] for i in d2.argmin(axis=1)]
+
 
 def extract_from_title(title: str) -> List[str]:
     """
@@ -85,21 +130,15 @@ def extract_from_title(title: str) -> List[str]:
     """
     if not title:
         return []
-    
-    title_lower = title.lower()
-    found_colors = []
-    
-    # Check for each color keyword
-    for color_name, keywords in COLOR_KEYWORDS.items():
-        for keyword in keywords:
-            # Use word boundary matching to avoid partial matches
-            pattern = r'\b' + re.escape(keyword) + r'\b'
-            if re.search(pattern, title_lower):
-                if color_name not in found_colors:
-                    found_colors.append(color_name)
-                break  # Found this color, move to next
-    
-    return found_colors
+
+    # Single scan over the title; word boundaries avoid partial matches
+    matched = set()
+    for m in TITLE_RE.finditer(title.lower()):
+        matched.update(KW_TO_COLORS[m.group(1)])
+
+    # Emit in COLOR_KEYWORDS order, like the old per-color loop did —
+    # callers truncate these lists, so order is part of the contract
+    return [color for color in COLOR_KEYWORDS if color in matched]
 
 
 def rgb_to_color_name(rgb: Tuple[int, int, int]) -> str:
@@ -112,17 +151,7 @@ def rgb_to_color_name(rgb: Tuple[int, int, int]) -> str:
     Returns:
         Color name string
     """
-    min_distance = float('inf')
-    closest_color = 'unknown'
-    
-    for color_name, ref_rgb in RGB_REFERENCE.items():
-        # Euclidean distance in RGB space
-        distance = sum((a - b) ** 2 for a, b in zip(rgb, ref_rgb)) ** 0.5
-        if distance < min_distance:
-            min_distance = distance
-            closest_color = color_name
-    
-    return closest_color
+    return nearest_color_names(np.asarray(rgb, dtype=np.float32))[0]
 
 
 def extract_dominant_colors(image: Image.Image, k: int = 5) -> List[str]:
@@ -143,38 +172,39 @@ def extract_dominant_colors(image: Image.Image, k: int = 5) -> List[str]:
         img = img.resize((100, 100))
         img = img.convert('RGB')
         
-        # Get pixels as numpy array
-        pixels = np.array(img).reshape(-1, 3)
-        
-        # Remove near-white and near-black pixels (often background)
-        mask = ~((pixels.sum(axis=1) > 700) | (pixels.sum(axis=1) < 50))
-        filtered_pixels = pixels[mask]
+        # Keep pixels as uint8 — sklearn casts to float itself, and the
+        # mask only needs a uint16 channel sum
+        pixels = np.asarray(img, dtype=np.uint8).reshape(-1, 3)
+
+        # Remove near-white and near-black pixels (often background):
+        # one sum + one fused range compare instead of two sum passes
+        s = pixels.sum(axis=1, dtype=np.uint16)
+        filtered_pixels = pixels[(s >= 50) & (s <= 700)]
         
         # If too few pixels after filtering, use original
         if len(filtered_pixels) < 100:
             filtered_pixels = pixels
         
-        # K-means clustering
-        kmeans = KMeans(n_clusters=min(k, len(filtered_pixels)), random_state=42, n_init=10)
-        kmeans.fit(filtered_pixels)
-        
+        # Mini-batch K-means converges in a couple of passes at 10K pixels;
+        # the full KMeans here ran 10 complete Lloyd inits per image
+        kmeans = MiniBatchKMeans(n_clusters=min(k, len(filtered_pixels)),
+                                 random_state=42, n_init=3)
+        labels = kmeans.fit_predict(filtered_pixels.astype(np.float32))
+
         # Get cluster centers (dominant colors)
         colors = kmeans.cluster_centers_.astype(int)
-        
+
         # Count pixels per cluster
-        labels = kmeans.predict(filtered_pixels)
         counts = Counter(labels)
         
-        # Sort by prevalence and map to color names
-        sorted_indices = [idx for idx, _ in counts.most_common()]
+        # Sort by prevalence and map all centers to names in one pass
+        names = nearest_color_names(colors)
         color_names = []
-        
-        for idx in sorted_indices:
-            rgb = tuple(colors[idx])
-            color_name = rgb_to_color_name(rgb)
-            if color_name not in color_names:
-                color_names.append(color_name)
-        
+
+        for idx, _ in counts.most_common():
+            if names[idx] not in color_names:
+                color_names.append(names[idx])
+
         return color_names
     
     except Exception as e:
@@ -182,6 +212,67 @@ def extract_dominant_colors(image: Image.Image, k: int = 5) -> List[str]:
         return []
 
 
+if numba is not None:
+    @numba.njit(fastmath=True, cache=True)
+    def _fast_palette_hist(pixels):
+        """32768-bin histogram of pixels packed to 5 bits per channel."""
+        hist = np.zeros(32768, dtype=np.int64)
+        for i in range(pixels.shape[0]):
+            packed = ((pixels[i, 0] >> 3) << 10) | \
+                     ((pixels[i, 1] >> 3) << 5) | \
+                     (pixels[i, 2] >> 3)
+            hist[packed] += 1
+        return hist
+
+
+def extract_colors_fast(image: Image.Image, k: int = 5) -> List[str]:
+    """
+    Dominant colors via a packed 15-bit histogram instead of K-means.
+
+    Quantizes each pixel to 5 bits per channel, histograms the result in a
+    numba-compiled loop, and maps the top-k bin centers to color names.
+    Same masking and ordering semantics as extract_dominant_colors but
+    with no clustering fit. Requires numba; callers should fall back to
+    extract_dominant_colors when it is unavailable.
+
+    Args:
+        image: PIL Image
+        k: Number of dominant bins to consider
+
+    Returns:
+        List of dominant color names ordered by prevalence
+    """
+    try:
+        img = image.convert('RGB').resize((100, 100))
+        pixels = np.asarray(img, dtype=np.uint8).reshape(-1, 3)
+
+        # Same background mask as the K-means path
+        s = pixels.sum(axis=1, dtype=np.int32)
+        filtered = pixels[~((s > 700) | (s < 50))]
+        if len(filtered) < 100:
+            filtered = pixels
+
+        hist = _fast_palette_hist(np.ascontiguousarray(filtered.astype(np.int64)))
+
+        top = np.argsort(hist)[::-1][:k]
+        top = top[hist[top] > 0]
+        # Bin centers: low 3 bits were truncated, add half a bin back
+        rgbs = np.stack([((top >> 10) & 31) << 3,
+                         ((top >> 5) & 31) << 3,
+                         (top & 31) << 3], axis=1) + 4
+
+        color_names = []
+        for name in nearest_color_names(rgbs):
+            if name not in color_names:
+                color_names.append(name)
+
+        return color_names
+
+    except Exception as e:
+        logger.warning(f"Error in histogram color extraction: {e}")
+        return []
+
+
 def extract_colors_ensemble(image: Image.Image, title: str = "") -> List[str]:
     """
     Ensemble method combining title parsing and K-means.
@@ -202,9 +293,13 @@ def extract_colors_ensemble(image: Image.Image, title: str = "") -> List[str]:
     """
     # Method 1: Title parsing (fast, high trust if found)
     title_colors = extract_from_title(title)
-    
-    # Method 2: K-means dominant colors (accurate)
-    image_colors = extract_dominant_colors(image)
+
+    # Method 2: dominant colors — JIT histogram when numba is available,
+    # K-means clustering otherwise
+    if numba is not None:
+        image_colors = extract_colors_fast(image)
+    else:
+        image_colors = extract_dominant_colors(image)
     
     # Combine results intelligently
     if title_colors:
@@ -220,46 +315,96 @@ def extract_colors_ensemble(image: Image.Image, title: str = "") -> List[str]:
         return image_colors[:5]
 
 
+def extract_colors_batch(images: List[Image.Image], titles: Optional[List[str]] = None) -> List[List[str]]:
+    """
+    Ensemble color extraction for several crops with ONE clustering pass.
+
+    All crops are downsampled to 64x64, their (masked) pixels stacked into a
+    single matrix and clustered once with MiniBatchKMeans; labels are split
+    back per crop by offsets. Avoids N separate KMeans fits when a request
+    carries multiple detections.
+
+    Args:
+        images: List of PIL Images
+        titles: Optional matching list of product titles
+
+    Returns:
+        One color-name list per input image, same semantics as
+        extract_colors_ensemble.
+    """
+    if not images:
+        return []
+    if titles is None:
+        titles = [""] * len(images)
+
+    try:
+        pixel_blocks = []
+        for img in images:
+            pixels = np.asarray(img.convert('RGB').resize((64, 64)), dtype=np.uint8).reshape(-1, 3)
+            # Same background mask as the single-image path
+            s = pixels.sum(axis=1, dtype=np.uint16)
+            filtered = pixels[(s >= 50) & (s <= 700)]
+            if len(filtered) < 100:
+                filtered = pixels
+            pixel_blocks.append(filtered)
+
+        all_pixels = np.concatenate(pixel_blocks).astype(np.float32)
+        offsets = np.cumsum([0] + [len(b) for b in pixel_blocks])
+
+        kmeans = MiniBatchKMeans(n_clusters=min(8, len(all_pixels)),
+                                 random_state=42, n_init=3)
+        labels = kmeans.fit_predict(all_pixels)
+        centers = kmeans.cluster_centers_.astype(int)
+        center_names = nearest_color_names(centers)
+
+        results = []
+        for i, title in enumerate(titles):
+            crop_labels = labels[offsets[i]:offsets[i + 1]]
+            counts = np.bincount(crop_labels, minlength=len(centers))
+
+            image_colors = []
+            for idx in np.argsort(counts)[::-1]:
+                if counts[idx] == 0:
+                    break
+                name = center_names[idx]
+                if name not in image_colors:
+                    image_colors.append(name)
+
+            # Same title-first combination as extract_colors_ensemble
+            title_colors = extract_from_title(title)
+            if title_colors:
+                combined = title_colors.copy()
+                for color in image_colors:
+                    if color not in combined:
+                        combined.append(color)
+                results.append(combined[:5])
+            else:
+                results.append(image_colors[:5])
+
+        return results
+
+    except Exception as e:
+        logger.warning(f"Batched color extraction failed, falling back per-crop: {e}")
+        return [extract_colors_ensemble(img, title)
+                for img, title in zip(images, titles)]
+
+
 def get_color_similarity_tier(query_color: str, product_color: str) -> str:
     """
     Determine similarity tier between two colors.
     Used for tiered ranking in search results.
-    
+
+    Delegates to the canonical tier table in filters.py — this module used
+    to rebuild its own (drifted) copy of COLOR_SIMILARITY on every call.
+
     Returns: "exact", "similar", "related", or "none"
     """
-    COLOR_SIMILARITY = {
-        'red': {'similar': ['crimson', 'scarlet'], 'related': ['maroon', 'pink', 'orange']},
-        'maroon': {'similar': ['burgundy', 'wine'], 'related': ['red', 'brown', 'purple']},
-        'pink': {'similar': ['rose', 'blush'], 'related': ['red', 'purple', 'coral']},
-        'blue': {'similar': ['azure', 'cobalt'], 'related': ['navy', 'teal', 'purple']},
-        'navy': {'similar': ['midnight'], 'related': ['blue', 'black']},
-        'green': {'similar': ['emerald', 'lime'], 'related': ['olive', 'teal']},
-        'yellow': {'similar': ['gold', 'amber'], 'related': ['orange', 'beige']},
-        'orange': {'similar': ['tangerine', 'rust'], 'related': ['red', 'yellow', 'brown']},
-        'white': {'similar': ['ivory', 'cream'], 'related': ['beige', 'grey', 'silver']},
-        'black': {'similar': ['ebony', 'jet'], 'related': ['grey', 'navy']},
-        'grey': {'similar': ['charcoal', 'slate', 'silver'], 'related': ['black', 'white']},
-        'brown': {'similar': ['chocolate', 'tan'], 'related': ['beige', 'orange', 'maroon']},
-        'purple': {'similar': ['violet', 'lavender'], 'related': ['pink', 'blue', 'maroon']},
-        'beige': {'similar': ['tan', 'nude', 'cream'], 'related': ['brown', 'white', 'khaki']},
-    }
-    
-    # Normalize colors
-    qc = query_color.lower()
-    pc = product_color.lower()
-    
-    # Exact match
-    if qc == pc:
-        return "exact"
-    
-    # Check similarity tiers
-    sim_data = COLOR_SIMILARITY.get(qc, {})
-    if pc in sim_data.get('similar', []):
-        return "similar"
-    if pc in sim_data.get('related', []):
-        return "related"
-    
-    return "none"
+    try:
+        from .filters import get_color_tier
+    except ImportError:  # running as a plain script, outside the package
+        from filters import get_color_tier
+
+    return get_color_tier(query_color, product_color)
 
 
 if __name__ == "__main__":
@@ -2,13 +2,28 @@ import os
 import torch
 import numpy as np
 from PIL import Image
+from torch.utils.data import Dataset, DataLoader
 from torchvision import transforms
 
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+USE_FP16 = DEVICE == "cuda"
 
 DINO_MODEL = torch.hub.load("facebookresearch/dinov2", "dinov2_vitb14").to(DEVICE)
 DINO_MODEL.eval()
 
+# fp16 tensor cores + compiled graph: the ViT forward is compute-bound
+if USE_FP16:
+    DINO_MODEL = DINO_MODEL.half()
+# On CPU boxes the Linear layers dominate; dynamic INT8 uses VNNI int8
+# kernels for 2-4x there. Opt-in: costs a little embedding precision.
+elif os.getenv("CPU_INT8", "0") == "1":
+    DINO_MODEL = torch.ao.quantization.quantize_dynamic(
+        DINO_MODEL, {torch.nn.Linear}, dtype=torch.qint8)
+try:
+    DINO_MODEL = torch.compile(DINO_MODEL, mode="reduce-overhead")
+except Exception:
+    pass  # torch.compile unavailable on this torch build
+
 TRANSFORM = transforms.Compose([
     transforms.Resize(256),
     transforms.CenterCrop(224),
@@ -18,12 +33,84 @@ TRANSFORM = transforms.Compose([
 
 def embed_image(image_path):
     image = Image.open(image_path).convert("RGB")
-    tensor = TRANSFORM(image).unsqueeze(0).to(DEVICE)
+    return embed_image_pil(image)
+
+def embed_image_pil(image):
+    """Embed an already-decoded PIL image, skipping the disk round-trip."""
+    tensor = TRANSFORM(image.convert("RGB")).unsqueeze(0).to(DEVICE)
+    if USE_FP16:
+        tensor = tensor.half()
 
-    with torch.no_grad():
+    with torch.inference_mode():
         embedding = DINO_MODEL(tensor)
 
-    return embedding.squeeze().cpu().numpy().astype("float32")
+    return embedding.squeeze().float().cpu().numpy().astype("float32")
+
+def embed_images(images):
+    """Embed a batch of PIL images with a single forward pass.
+
+    Returns an (N, D) float32 array, one row per image.
+    """
+    batch = torch.stack([TRANSFORM(img.convert("RGB")) for img in images]).to(DEVICE)
+    if USE_FP16:
+        batch = batch.half()
+
+    with torch.inference_mode():
+        embeddings = DINO_MODEL(batch)
+
+    return embeddings.float().cpu().numpy().astype("float32")
+
+def embed_images_tensor(images):
+    """Embed a batch of PIL images, returning the (N, D) torch tensor.
+
+    Used when the FAISS index lives on the same GPU so the query vectors
+    never round-trip through host memory / numpy.
+    """
+    batch = torch.stack([TRANSFORM(img.convert("RGB")) for img in images]).to(DEVICE)
+    if USE_FP16:
+        batch = batch.half()
+
+    with torch.inference_mode():
+        embeddings = DINO_MODEL(batch)
+
+    return embeddings.float()
+
+class _ImageFileDataset(Dataset):
+    """Decodes and transforms image files inside DataLoader workers."""
+
+    def __init__(self, paths):
+        self.paths = paths
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, i):
+        return TRANSFORM(Image.open(self.paths[i]).convert("RGB"))
+
+def embed_image_paths(paths, batch_size=32, num_workers=4):
+    """Embed image files, overlapping JPEG decode with the GPU forward.
+
+    DataLoader workers decode and transform the next batch while the GPU
+    embeds the current one; pinned memory makes the host-to-device copy
+    asynchronous. Small lists skip worker spawn overhead and load inline.
+    Returns an (N, D) float32 array in input order.
+    """
+    loader = DataLoader(
+        _ImageFileDataset(paths),
+        batch_size=batch_size,
+        num_workers=num_workers if len(paths) >= 2 * batch_size else 0,
+        pin_memory=(DEVICE == "cuda"),
+    )
+
+    outs = []
+    with torch.inference_mode():
+        for batch in loader:
+            batch = batch.to(DEVICE, non_blocking=True)
+            if USE_FP16:
+                batch = batch.half()
+            outs.append(DINO_MODEL(batch).float().cpu())
+
+    return torch.cat(outs).numpy().astype("float32")
 
 def aggregate_embeddings(embeddings):
     return np.mean(embeddings, axis=0).astype("float32")
@@ -7,7 +7,15 @@ Filters are applied AFTER FAISS search on the unified index.
 from typing import List, Dict, Any
 import logging
 
-logging.basicConfig(level=logging.INFO)
+import numpy as np
+
+# Optional JIT for the ragged tier-scoring loop (same guarded pattern as
+# color_extractor); the NumPy reduceat path below is the fallback.
+try:
+    import numba
+except ImportError:
+    numba = None
+
 logger = logging.getLogger(__name__)
 
 # Category groupings for flexible matching
@@ -50,10 +58,65 @@ CATEGORY_GROUPS = {
     'upperwear': ['shirt', 't-shirt', 'top', 'blouse', 'sweater', 'jacket', 'hoodie', 'cardigan', 'coat'],
     'lowerwear': ['pants', 'jeans', 'trousers', 'shorts', 'leggings', 'skirt', 'palazzo'],
     'footwear': ['shoes', 'sneakers', 'sandals', 'boots', 'heels', 'slippers', 'loafers'],
-    'accessories': ['watch', 'bracelet', 'necklace', 'earrings', 'ring', 'bag', 'purse', 'handbag', 
+    'accessories': ['watch', 'bracelet', 'necklace', 'earrings', 'ring', 'bag', 'purse', 'handbag',
                     'backpack', 'belt', 'scarf', 'hat', 'cap', 'sunglasses'],
 }
 
+# Frozen once at import: membership tests in the per-product loop become a
+# hash probe instead of a linear list scan. The target itself is always
+# allowed, so callers need no separate equality check.
+_CATEGORY_ALLOWED = {k: frozenset(v) | {k} for k, v in CATEGORY_GROUPS.items()}
+
+# Integer vocabularies for the hot-path comparisons: instead of
+# re-lowercasing and hashing category/gender strings per product per
+# query, the normalized id is computed once and cached on the meta dict
+# (api.py shares meta dicts across requests via its lru_cache, so the
+# cache survives between searches). Unseen values get ids on first sight.
+CAT_VOCAB = {}
+for _k, _v in _CATEGORY_ALLOWED.items():
+    for _c in _v:
+        CAT_VOCAB.setdefault(_c, len(CAT_VOCAB))
+_CATEGORY_ALLOWED_IDS = {_k: frozenset(CAT_VOCAB[_c] for _c in _v)
+                         for _k, _v in _CATEGORY_ALLOWED.items()}
+
+GENDER_VOCAB = {'': 0, 'unisex': 1}
+_GID_EMPTY = 0
+_GID_UNISEX = 1
+
+
+def _allowed_cat_ids(target_category: str) -> frozenset:
+    ids = _CATEGORY_ALLOWED_IDS.get(target_category)
+    if ids is None:
+        ids = frozenset((CAT_VOCAB.setdefault(target_category, len(CAT_VOCAB)),))
+        _CATEGORY_ALLOWED_IDS[target_category] = ids
+    return ids
+
+
+def _product_cat_id(meta: Dict[str, Any]) -> int:
+    """Normalized category id, computed once and cached on the meta dict."""
+    cid = meta.get('_cat_id')
+    if cid is None:
+        category_data = meta.get('category', '')
+        if isinstance(category_data, dict):
+            name = category_data.get('id', '').lower()
+        elif isinstance(category_data, str):
+            name = category_data.lower()
+        else:
+            name = ''
+        cid = CAT_VOCAB.setdefault(name, len(CAT_VOCAB))
+        meta['_cat_id'] = cid
+    return cid
+
+
+def _product_gender_id(meta: Dict[str, Any]) -> int:
+    gid = meta.get('_gender_id')
+    if gid is None:
+        g = meta.get('attributes', {}).get('gender', '')
+        name = g.lower() if isinstance(g, str) else ''
+        gid = GENDER_VOCAB.setdefault(name, len(GENDER_VOCAB))
+        meta['_gender_id'] = gid
+    return gid
+
 # Color similarity tiers for tiered ranking
 COLOR_SIMILARITY = {
     'red': {'exact': ['red'], 'similar': ['crimson', 'scarlet', 'cherry'], 'related': ['maroon', 'pink', 'orange']},
@@ -76,6 +139,60 @@ COLOR_SIMILARITY = {
     'silver': {'exact': ['silver'], 'similar': ['chrome', 'metallic'], 'related': ['grey', 'white']},
 }
 
+# Reverse index built once at import: _TIER[query][product] -> tier.
+# get_color_tier runs inside a query x product double loop per candidate,
+# so the lookup collapses to one hash probe instead of three list scans.
+_TIER = {}
+for _q, _tiers in COLOR_SIMILARITY.items():
+    _q_map = _TIER.setdefault(_q, {_q: 'exact'})
+    for _tier_name in ('exact', 'similar', 'related'):
+        for _p in _tiers.get(_tier_name, []):
+            _q_map.setdefault(_p, _tier_name)
+
+_EMPTY = {}
+
+# Integer color vocabulary + tier matrix for the vectorized filter path.
+# TIER_MATRIX[query_id, product_id] scores 3=exact, 2=similar, 1=related,
+# 0=none; the diagonal is exact by definition. Colors outside the
+# vocabulary fall back to string-identity matching.
+COLOR_IDS = {}
+for _q, _q_map in _TIER.items():
+    for _c in (_q, *_q_map):
+        COLOR_IDS.setdefault(_c, len(COLOR_IDS))
+
+_TIER_SCORE = {'exact': 3, 'similar': 2, 'related': 1}
+TIER_MATRIX = np.zeros((len(COLOR_IDS), len(COLOR_IDS)), dtype=np.int8)
+for _q, _q_map in _TIER.items():
+    for _p, _t in _q_map.items():
+        TIER_MATRIX[COLOR_IDS[_q], COLOR_IDS[_p]] = _TIER_SCORE[_t]
+np.fill_diagonal(TIER_MATRIX, _TIER_SCORE['exact'])
+
+if numba is not None:
+    @numba.njit(parallel=True, cache=True)
+    def _best_tiers(flat, offsets, q_ids, tier_matrix):
+        """Per-product max tier over ragged color-id segments.
+
+        Walks the flat id array directly instead of building the
+        per_color temporary the NumPy path needs; products are
+        independent, so the outer loop parallelizes cleanly.
+        """
+        n = len(offsets) - 1
+        out = np.zeros(n, dtype=np.int8)
+        for i in numba.prange(n):
+            best = np.int8(0)
+            for j in range(offsets[i], offsets[i + 1]):
+                c = flat[j]
+                if c < 0:
+                    continue  # out-of-vocabulary color
+                for q in q_ids:
+                    t = tier_matrix[q, c]
+                    if t > best:
+                        best = t
+            out[i] = best
+        return out
+else:
+    _best_tiers = None
+
 
 def filter_by_category(products: List[Dict[str, Any]], target_category: str) -> List[Dict[str, Any]]:
     """
@@ -92,28 +209,16 @@ def filter_by_category(products: List[Dict[str, Any]], target_category: str) ->
     if not target_category or target_category == "unknown":
         return products  # No filtering if category unknown
     
-    # Get allowed categories for matching
-    allowed = CATEGORY_GROUPS.get(target_category.lower(), [target_category.lower()])
-    
-    filtered = []
-    for product in products:
-        #  FIX: Handle both string and dict category formats
-        category_data = product.get('meta', {}).get('category', '')
-        
-        if isinstance(category_data, dict):
-            # Extract 'id' from dict: {"id": "earring", "label": "Earrings"}
-            product_category = category_data.get('id', '').lower()
-        elif isinstance(category_data, str):
-            # Already a string: "earring"
-            product_category = category_data.lower()
-        else:
-            product_category = ''
-        
-        # Direct match or group match
-        if product_category in allowed or product_category == target_category.lower():
-            filtered.append(product)
+    # Get allowed category ids for matching (hoisted out of the loop)
+    allowed = _allowed_cat_ids(target_category.lower())
+
+    # Direct match or group match as one small-int membership test; the
+    # dict/str normalization happens at most once per product
+    filtered = [p for p in products
+                if _product_cat_id(p.get('meta', {})) in allowed]
     
-    logger.info(f"Category filter: {len(products)} → {len(filtered)} products (target: {target_category})")
+    logger.info("Category filter: %d → %d products (target: %s)",
+                len(products), len(filtered), target_category)
     return filtered
 
 def get_color_tier(query_color: str, product_color: str) -> str:
@@ -124,22 +229,13 @@ def get_color_tier(query_color: str, product_color: str) -> str:
     """
     qc = query_color.lower()
     pc = product_color.lower()
-    
+
     # Exact match
     if qc == pc:
         return "exact"
-    
-    # Check similarity tiers
-    sim_data = COLOR_SIMILARITY.get(qc, {})
-    
-    if pc in sim_data.get('exact', []):
-        return "exact"
-    if pc in sim_data.get('similar', []):
-        return "similar"
-    if pc in sim_data.get('related', []):
-        return "related"
-    
-    return "none"
+
+    # Single probe of the precomputed reverse index
+    return _TIER.get(qc, _EMPTY).get(pc, "none")
 
 
 def filter_by_color_tiered(
@@ -161,22 +257,24 @@ def filter_by_color_tiered(
     """
     if not query_colors:
         return products  # No color filtering if no colors detected
-    
-    exact_matches = []
-    similar_matches = []
-    related_matches = []
+
+    # Query colors as matrix row ids; out-of-vocabulary ones can only
+    # match by string identity
+    q_names = [qc.lower() if isinstance(qc, str) else str(qc).lower()
+               for qc in query_colors]
+    q_ids = np.array([COLOR_IDS[q] for q in q_names if q in COLOR_IDS],
+                     dtype=np.intp)
+    q_unknown = {q for q in q_names if q not in COLOR_IDS}
+
     no_color_matches = []
-    
+    entries = []      # (product, normalized_colors)
+    flat_ids = []     # color ids of every kept product, concatenated
+    offsets = [0]     # segment boundaries into flat_ids
+
     for product in products:
         # Get product colors from meta
         product_colors = product.get('meta', {}).get('attributes', {}).get('colors', [])
-        
-        # Handle products with no color data
-        if not product_colors:
-            if include_no_color:
-                no_color_matches.append(product)
-            continue
-        
+
         # ✅ FIX: Normalize product colors (handle dict, string, and mixed formats)
         normalized_colors = []
         for c in product_colors:
@@ -188,53 +286,48 @@ def filter_by_color_tiered(
             elif isinstance(c, str):
                 # Already a string: "white"
                 normalized_colors.append(c.lower())
-        
-        product_colors = normalized_colors  # Replace with normalized version
-        
-        # Skip if no valid colors after normalization
-        if not product_colors:
+
+        # Handle products with no (valid) color data
+        if not normalized_colors:
             if include_no_color:
                 no_color_matches.append(product)
             continue
-        
-        # Find best matching tier across all query colors
-        best_tier = "none"
-        
-        for qc in query_colors:
-            qc_lower = qc.lower() if isinstance(qc, str) else str(qc).lower()
-            
-            for pc in product_colors:
-                tier = get_color_tier(qc_lower, pc)
-                
-                # Update best tier (exact > similar > related > none)
-                if tier == "exact":
-                    best_tier = "exact"
-                    break
-                elif tier == "similar" and best_tier != "exact":
-                    best_tier = "similar"
-                elif tier == "related" and best_tier not in ["exact", "similar"]:
-                    best_tier = "related"
-            
-            if best_tier == "exact":
-                break  # Found exact match, no need to continue
-        
-        # Categorize by tier
-        if best_tier == "exact":
-            exact_matches.append(product)
-        elif best_tier == "similar":
-            similar_matches.append(product)
-        elif best_tier == "related":
-            related_matches.append(product)
-    
+
+        entries.append((product, normalized_colors))
+        flat_ids.extend(COLOR_IDS.get(pc, -1) for pc in normalized_colors)
+        offsets.append(len(flat_ids))
+
+    # One matrix slice + segmented max scores every product at once:
+    # TIER_MATRIX[q_ids][:, colors].max over the query axis gives each
+    # color's best tier, reduceat takes the max within each product
+    buckets = {3: [], 2: [], 1: []}
+    if entries:
+        flat = np.asarray(flat_ids, dtype=np.intp)
+        offs = np.asarray(offsets, dtype=np.intp)
+        if _best_tiers is not None and len(q_ids):
+            best = _best_tiers(flat, offs, q_ids, TIER_MATRIX)
+        else:
+            known = flat >= 0
+            per_color = np.zeros(len(flat), dtype=np.int8)
+            if len(q_ids) and known.any():
+                per_color[known] = TIER_MATRIX[np.ix_(q_ids, flat[known])].max(axis=0)
+            best = np.maximum.reduceat(per_color, offs[:-1])
+
+        for (product, normalized_colors), tier in zip(entries, best):
+            if tier == 0 and q_unknown and q_unknown.intersection(normalized_colors):
+                tier = 3  # identity match outside the vocabulary
+            if tier > 0:
+                buckets[int(tier)].append(product)
+
     # Combine in tiered order
-    result = exact_matches + similar_matches + related_matches
-    
+    result = buckets[3] + buckets[2] + buckets[1]
+
     if include_no_color:
         result += no_color_matches
-    
-    logger.info(f"Color filter: {len(exact_matches)} exact, {len(similar_matches)} similar, "
-                f"{len(related_matches)} related, {len(no_color_matches)} no-color")
-    
+
+    logger.info("Color filter: %d exact, %d similar, %d related, %d no-color",
+                len(buckets[3]), len(buckets[2]), len(buckets[1]), len(no_color_matches))
+
     return result
 def filter_by_gender(products: List[Dict[str, Any]], target_gender: str) -> List[Dict[str, Any]]:
     """
@@ -252,19 +345,37 @@ def filter_by_gender(products: List[Dict[str, Any]], target_gender: str) -> List
         return products
     
     target_gender = target_gender.lower()
+    tg = GENDER_VOCAB.setdefault(target_gender, len(GENDER_VOCAB))
+
+    # Match target gender or unisex/unset products, as int comparisons
+    filtered = [p for p in products
+                if _product_gender_id(p.get('meta', {})) in (tg, _GID_UNISEX, _GID_EMPTY)]
     
-    filtered = []
-    for product in products:
-        # Gender is inside attributes
-        product_gender = product.get('meta', {}).get('attributes', {}).get('gender', '').lower()
-        
-        # Match target gender or unisex products
-        if product_gender == target_gender or product_gender == 'unisex' or not product_gender:
-            filtered.append(product)
-    
-    logger.info(f"Gender filter: {len(products)} → {len(filtered)} products (target: {target_gender})")
+    logger.info("Gender filter: %d → %d products (target: %s)",
+                len(products), len(filtered), target_gender)
     return filtered
 
+def build_product_columns(products: List[Dict[str, Any]]):
+    """
+    Extract the filterable fields into parallel arrays (AoS -> SoA).
+
+    One walk over the candidate dicts replaces the repeated
+    meta/attributes dereferencing that each filter pass used to do;
+    the cheap predicates then run as vectorized masks over these
+    columns. Values are small vocabulary ids, not strings, so the masks
+    compare ints.
+    """
+    cats = np.empty(len(products), dtype=np.int32)
+    genders = np.empty(len(products), dtype=np.int32)
+
+    for i, product in enumerate(products):
+        meta = product.get('meta', {})
+        cats[i] = _product_cat_id(meta)
+        genders[i] = _product_gender_id(meta)
+
+    return cats, genders
+
+
 def apply_all_filters(
     products: List[Dict[str, Any]],
     category: str = None,
@@ -273,20 +384,34 @@ def apply_all_filters(
     max_results: int = 10
 ) -> List[Dict[str, Any]]:
     """
-    Apply all post-filters in sequence.
-    Order: Category → Color (tiered) → Gender → Limit
+    Apply all post-filters.
+    The cheap predicates (category, gender) combine into one boolean mask
+    over columnar views of the candidates; tiered color matching then
+    reorders the survivors. Same semantics as running the standalone
+    filters in sequence.
     """
 
     original = products
 
-    # Apply filters
     result = products
-    if category:
-        result = filter_by_category(result, category)
+    if products and (category or gender):
+        cats, genders = build_product_columns(products)
+        mask = np.ones(len(products), dtype=bool)
+
+        if category and category != "unknown":
+            allowed = _allowed_cat_ids(category.lower())
+            mask &= np.isin(cats, list(allowed))
+
+        if gender and isinstance(gender, str):
+            tg = GENDER_VOCAB.setdefault(gender.lower(), len(GENDER_VOCAB))
+            mask &= (genders == tg) | (genders == _GID_UNISEX) | (genders == _GID_EMPTY)
+
+        if not mask.all():
+            result = [p for p, keep in zip(products, mask) if keep]
+        logger.info("Category/gender filter: %d → %d products", len(products), len(result))
+
     if colors:
         result = filter_by_color_tiered(result, colors)
-    if gender:
-        result = filter_by_gender(result, gender)
 
     # Fallback: if filtering was too strict
     if not result:
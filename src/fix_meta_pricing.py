@@ -1,12 +1,35 @@
 import json
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
 from pathlib import Path
 from typing import Optional
 
+try:
+    import orjson  # ~6x faster than stdlib json for these small files
+except ImportError:
+    orjson = None
+
 
 DATASET_DIR = Path("dataset/products")   # local path
 # Example: dataset/products/P000001/meta.json
 
+# {path: mtime} of files already processed — lets a re-run skip every
+# file untouched since the last pass
+FIXED_LOG = Path("dataset/fixed.log")
+
+# Hoisted out of parse_price_to_int — this runs once per meta file
+_CURRENCY_RE = re.compile(r"(rs\.?|inr|₹)", re.IGNORECASE)
+
+# Deletes every non-digit Latin-1 char in one C pass, no regex engine;
+# the rare leftovers outside Latin-1 fall back to the regex below.
+# isdecimal, not isdigit: superscripts like ² are isdigit-true but
+# int() rejects them
+_NON_DIGITS = str.maketrans('', '', ''.join(
+    chr(c) for c in range(256) if not chr(c).isdecimal()))
+_NON_DIGIT_RE = re.compile(r"\D+")
+
 
 def parse_price_to_int(price_value) -> Optional[int]:
     """
@@ -19,6 +42,10 @@ def parse_price_to_int(price_value) -> Optional[int]:
     if price_value is None:
         return None
 
+    # Fast path: most values are already correct small ints
+    if isinstance(price_value, int) and price_value < 100000:
+        return price_value
+
     # if already correct int in range
     if isinstance(price_value, int):
         #  Fix wrong values like 499900, 355900, etc.
@@ -36,10 +63,12 @@ def parse_price_to_int(price_value) -> Optional[int]:
 
         # remove Rs, INR, commas, spaces
         s = s.replace(",", "")
-        s = re.sub(r"(rs\.?|inr|₹)", "", s, flags=re.IGNORECASE).strip()
+        s = _CURRENCY_RE.sub("", s).strip()
 
         # keep only digits
-        digits = re.sub(r"[^\d]", "", s)
+        digits = s.translate(_NON_DIGITS)
+        if digits and not digits.isdecimal():  # non-Latin-1 stragglers
+            digits = _NON_DIGIT_RE.sub("", digits)
         if not digits:
             return None
 
@@ -61,8 +90,8 @@ def fix_meta_file(meta_path: Path) -> bool:
     Returns True if changed.
     """
     try:
-        with open(meta_path, "r", encoding="utf-8") as f:
-            meta = json.load(f)
+        raw = meta_path.read_bytes()
+        meta = orjson.loads(raw) if orjson else json.loads(raw)
     except Exception as e:
         print(f" Failed reading: {meta_path} | {e}")
         return False
@@ -90,8 +119,11 @@ def fix_meta_file(meta_path: Path) -> bool:
 
     if changed:
         try:
-            with open(meta_path, "w", encoding="utf-8") as f:
-                json.dump(meta, f, ensure_ascii=False, indent=2)
+            if orjson:
+                meta_path.write_bytes(orjson.dumps(meta, option=orjson.OPT_INDENT_2))
+            else:
+                with open(meta_path, "w", encoding="utf-8") as f:
+                    json.dump(meta, f, ensure_ascii=False, indent=2)
         except Exception as e:
             print(f" Failed writing: {meta_path} | {e}")
             return False
@@ -99,21 +131,99 @@ def fix_meta_file(meta_path: Path) -> bool:
     return changed
 
 
+def load_fixed_log() -> dict:
+    try:
+        raw = FIXED_LOG.read_bytes()
+        return orjson.loads(raw) if orjson else json.loads(raw)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_fixed_log(mtimes: dict) -> None:
+    try:
+        if orjson:
+            FIXED_LOG.write_bytes(orjson.dumps(mtimes))
+        else:
+            FIXED_LOG.write_text(json.dumps(mtimes))
+    except OSError as e:
+        print(f" Failed writing {FIXED_LOG} | {e}")
+
+
+def iter_meta_files(root: Path, mtimes: dict):
+    """Yield P*/meta.json paths via one scandir pass, skipping unchanged files.
+
+    A generator instead of list(glob): main() pulls chunks from it as
+    workers free up, so the walk overlaps with processing and only the
+    in-flight window of paths is ever held in memory.
+    """
+    with os.scandir(root) as it:
+        for e in it:
+            if not (e.is_dir() and e.name.startswith("P")):
+                continue
+            p = os.path.join(e.path, "meta.json")
+            try:
+                mtime = os.stat(p).st_mtime
+            except OSError:
+                continue
+            # mtime unchanged since the last run means nothing to re-parse
+            if mtimes.get(p) != mtime:
+                yield p
+
+
+def _fix_and_stat(path: str):
+    """Worker wrapper: fix one file and report its post-write mtime."""
+    changed = fix_meta_file(Path(path))
+    try:
+        return path, changed, os.stat(path).st_mtime
+    except OSError:
+        return path, changed, None
+
+
+def _fix_chunk(paths: list):
+    """Process one chunk of paths in a worker (amortizes pool dispatch)."""
+    return [_fix_and_stat(p) for p in paths]
+
+
 def main():
-    meta_files = list(DATASET_DIR.glob("P*/meta.json"))
-    print(f" Found {len(meta_files)} meta.json files")
+    mtimes = load_fixed_log()
 
+    total = 0
     changed_count = 0
-    for i, meta_path in enumerate(meta_files, 1):
-        if fix_meta_file(meta_path):
-            changed_count += 1
-
-        if i % 5000 == 0:
-            print(f"Processed {i}/{len(meta_files)} | fixed: {changed_count}")
+    # Each file is an independent read-modify-write: worker processes
+    # parallelize the JSON parse/encode and overlap the disk IO. Paths
+    # go out in 512-file chunks (amortizing dispatch, like map's
+    # chunksize) but through a bounded window of pending futures —
+    # Executor.map would drain the whole generator up front, holding
+    # every path in memory and deferring the walk/processing overlap.
+    paths = iter_meta_files(DATASET_DIR, mtimes)
+    chunks = iter(lambda: list(islice(paths, 512)), [])
+    with ProcessPoolExecutor() as ex:
+        max_in_flight = 2 * (os.cpu_count() or 1)
+        pending = {ex.submit(_fix_chunk, c) for c in islice(chunks, max_in_flight)}
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                for path, changed, mtime in future.result():
+                    total += 1
+                    if changed:
+                        changed_count += 1
+                    if mtime is not None:
+                        mtimes[path] = mtime
+
+                    if total % 5000 == 0:
+                        print(f"Processed {total} | fixed: {changed_count}")
+
+            # Refill the window with one new chunk per drained future
+            for c in islice(chunks, len(done)):
+                pending.add(ex.submit(_fix_chunk, c))
+
+    save_fixed_log(mtimes)
 
     print("\n==============================")
     print("DONE")
-    print(f"Total meta.json files: {len(meta_files)}")
+    print(f"Meta files processed : {total}")
     print(f"Fixed pricing in     : {changed_count}")
     print("==============================")
 
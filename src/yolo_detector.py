@@ -1,33 +1,152 @@
 from ultralytics import YOLO
 from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import logging
+import numpy as np
 import os
+import torch
 
-YOLO_MODEL = YOLO("models/yolov8n.pt")
+# SIMD JPEG decoding (libjpeg-turbo) — 2-4x faster than PIL's libjpeg path.
+# Optional: falls back to PIL when PyTurboJPEG or the native lib is missing.
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB
+    _turbojpeg = TurboJPEG()
+except Exception:
+    _turbojpeg = None
 
-def detect_and_crop(image_path, output_dir, conf=0.3):
-    os.makedirs(output_dir, exist_ok=True)
+# Catalog shots can exceed PIL's decompression-bomb threshold; the images
+# are our own, so skip the check rather than crash mid-run
+Image.MAX_IMAGE_PIXELS = None
+
+logger = logging.getLogger(__name__)
+
+# Prefer the TensorRT FP16 engine when one has been exported
+# (offline, once: yolo export model=models/yolov8n.pt format=engine half=True).
+# FP16 tensor-core inference roughly doubles detector throughput; the
+# PyTorch weights remain the fallback on machines without an engine.
+_ENGINE_PATH = "models/yolov8n.engine"
+
+if os.path.exists(_ENGINE_PATH):
+    YOLO_MODEL = YOLO(_ENGINE_PATH)  # engine backend picks its device itself
+else:
+    logger.warning("No TensorRT engine at %s, loading PyTorch weights", _ENGINE_PATH)
+    YOLO_MODEL = YOLO("models/yolov8n.pt")
+    if torch.cuda.is_available():
+        YOLO_MODEL.to("cuda")
+
+if torch.cuda.is_available():
+    # inputs are letterboxed to a fixed 640x640, so the autotuner's
+    # one-off algorithm search pays for itself immediately
+    torch.backends.cudnn.benchmark = True
+
+# One dummy forward at import absorbs the lazy init (cuDNN autotune /
+# engine context creation) so the first real image skips it
+try:
+    YOLO_MODEL(np.zeros((640, 640, 3), dtype=np.uint8), verbose=False)
+except Exception as e:
+    logger.warning("YOLO warmup failed: %s", e)
 
-    image = Image.open(image_path).convert("RGB")
-    results = YOLO_MODEL(image_path, conf=conf)[0]
+def _load_rgb(image_path):
+    """Decode an image file to RGB, via turbojpeg when available."""
+    if _turbojpeg is not None:
+        try:
+            with open(image_path, "rb") as f:
+                return Image.fromarray(_turbojpeg.decode(f.read(), pixel_format=TJPF_RGB))
+        except Exception:
+            pass  # not a JPEG or decode failed, fall through to PIL
+    return Image.open(image_path).convert("RGB")
 
+def _save_crops(image, results, output_dir, base):
+    """Crop every detected box out of image and save under output_dir."""
     crops = []
-    boxes = results.boxes.xyxy.cpu().numpy() if len(results.boxes) else []
+    if not len(results.boxes):
+        return crops
 
-    for i, box in enumerate(boxes):
-        x1, y1, x2, y2 = map(int, box)
-        # clamp coordinates
-        x1, y1 = max(0, x1), max(0, y1)
-        x2, y2 = max(x1 + 1, x2), max(y1 + 1, y2)
+    boxes = results.boxes.xyxy.cpu().numpy().astype(int)
 
-        crop = image.crop((x1, y1, x2, y2))
-        base = os.path.splitext(os.path.basename(image_path))[0]
-        crop_name = f"{base}_crop_{i}.jpg"
-        crop_path = os.path.join(output_dir, crop_name)
+    # clamp all coordinates in one vectorized pass
+    w, h = image.size
+    boxes[:, 0] = np.clip(boxes[:, 0], 0, w - 1)
+    boxes[:, 1] = np.clip(boxes[:, 1], 0, h - 1)
+    boxes[:, 2] = np.clip(boxes[:, 2], 1, w)
+    boxes[:, 3] = np.clip(boxes[:, 3], 1, h)
 
-        # avoid overwriting existing crops
-        if not os.path.exists(crop_path):
-            crop.save(crop_path)
+    # decode to BGR once; crops below are plain array slices
+    image_np = cv2.cvtColor(np.asarray(image), cv2.COLOR_RGB2BGR)
 
-        crops.append(crop_path)
+    # one scandir batch instead of a stat syscall per box
+    existing = {e.name for e in os.scandir(output_dir)}
+
+    # cv2.imwrite (libjpeg-turbo) releases the GIL, so the JPEG encodes
+    # of a multi-detection image overlap on threads
+    futures = []
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        for x1, y1, x2, y2 in boxes:
+            x2, y2 = max(x1 + 1, x2), max(y1 + 1, y2)
+
+            # key the name by coordinates so re-runs of the same image
+            # map to the same files regardless of detection order
+            crop_name = f"{base}_{x1}_{y1}_{x2}_{y2}.jpg"
+            crop_path = os.path.join(output_dir, crop_name)
+
+            # avoid overwriting existing crops
+            if crop_name not in existing:
+                futures.append(pool.submit(
+                    cv2.imwrite, crop_path, image_np[y1:y2, x1:x2],
+                    [cv2.IMWRITE_JPEG_QUALITY, 90]))
+
+            crops.append(crop_path)
+
+        for f in futures:
+            f.result()
 
     return crops
+
+def detect_and_crop(image_src, output_dir, conf=0.3, name=None):
+    """Detect items and save the crops to output_dir.
+
+    image_src is either a file path or an already-decoded PIL image — the
+    latter lets callers that fetched from S3 skip the disk round-trip.
+    In-memory callers pass name to control the crop filenames.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    if isinstance(image_src, Image.Image):
+        image = image_src.convert("RGB")
+        base = name or "image"
+    else:
+        # decode once here — handing YOLO the path would make it re-read
+        # and re-decode the same JPEG
+        image = _load_rgb(image_src)
+        base = name or os.path.splitext(os.path.basename(image_src))[0]
+
+    with torch.inference_mode():
+        results = YOLO_MODEL(image, conf=conf)[0]
+
+    return _save_crops(image, results, output_dir, base)
+
+def detect_and_crop_batch(image_paths, output_dir, conf=0.3, batch_size=32):
+    """Detect and crop many images with one batched forward pass per chunk.
+
+    A single YOLO call per batch amortizes the Python dispatch and kernel
+    launch overhead that detect_and_crop pays once per image. Returns a
+    list of crop-path lists aligned with image_paths.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    all_crops = []
+    with ThreadPoolExecutor() as pool:
+        for start in range(0, len(image_paths), batch_size):
+            chunk = image_paths[start:start + batch_size]
+            # JPEG decode releases the GIL, so thread the PIL loads and
+            # keep a single batched model call per chunk
+            images = list(pool.map(_load_rgb, chunk))
+            with torch.inference_mode():
+                results_list = YOLO_MODEL(images, conf=conf)
+
+            for path, image, results in zip(chunk, images, results_list):
+                base = os.path.splitext(os.path.basename(path))[0]
+                all_crops.append(_save_crops(image, results, output_dir, base))
+
+    return all_crops